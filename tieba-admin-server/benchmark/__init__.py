@@ -0,0 +1,113 @@
+"""
+离线性能测试
+
+在tieba-admin-server目录下以模块方式运行，例如::
+
+    python -m benchmark.keyword_matcher
+"""
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Coroutine, Any
+
+from tortoise import Tortoise, connections
+
+DB_CONFIG = {
+    'connections': {
+        'default': "sqlite://:memory:"
+    },
+    'apps': {
+        'models': {
+            "models": ["core.models", "plugins.review.models"],
+            'default_connection': 'default',
+        }
+    },
+    "use_tz": False,
+    "timezone": "Asia/Shanghai",
+}
+
+
+def measure(func: Callable, number: int = 100) -> float:
+    """
+    重复调用func，返回单次调用的平均耗时（单位：秒）
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+async def measure_async(func: Callable[[], Coroutine[Any, Any, Any]], number: int = 100) -> float:
+    """
+    重复await func()，返回单次调用的平均耗时（单位：秒）
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        await func()
+    return (time.perf_counter() - start) / number
+
+
+@asynccontextmanager
+async def memory_db():
+    """
+    使用内存sqlite数据库初始化Tortoise
+    """
+    await Tortoise.init(config=DB_CONFIG)
+    await Tortoise.generate_schemas()
+    try:
+        yield
+    finally:
+        await Tortoise.close_connections()
+
+
+class QueryCounter(object):
+    """
+    统计默认数据库上执行的SQL语句数
+
+    in_transaction()使用的是另一个连接对象（TransactionWrapper），因此替换的是连接类及其子类的方法，
+    事务内的语句同样会被统计
+    """
+    METHODS = ("execute_query", "execute_query_dict", "execute_insert", "execute_many", "execute_script")
+
+    def __init__(self):
+        self.count = 0
+        self._origin = []
+
+    @staticmethod
+    def _classes(cls):
+        yield cls
+        for sub in cls.__subclasses__():
+            yield from QueryCounter._classes(sub)
+
+    def __enter__(self):
+        for cls in set(self._classes(type(connections.get("default")))):
+            for name in self.METHODS:
+                if name in cls.__dict__:
+                    origin = cls.__dict__[name]
+                    self._origin.append((cls, name, origin))
+                    setattr(cls, name, self._wrap(origin))
+        return self
+
+    def __exit__(self, *args):
+        for cls, name, origin in self._origin:
+            setattr(cls, name, origin)
+        self._origin.clear()
+
+    def _wrap(self, origin):
+        async def wrapper(*args, **kwargs):
+            self.count += 1
+            return await origin(*args, **kwargs)
+
+        return wrapper
+
+
+def report(title: str, rows):
+    """
+    打印对比结果
+    Args:
+        title: 标题
+        rows: (名称, 耗时秒数) 的列表
+    """
+    print(f"== {title}")
+    base = rows[0][1]
+    for name, cost in rows:
+        print(f"{name:<32}{cost * 1e6:>12.2f} us{base / cost:>10.2f}x")
@@ -0,0 +1,47 @@
+"""
+对比check_black逐个对象查询数据库与使用内存黑名单的单对象耗时
+"""
+import asyncio
+import random
+
+from core.models import ForumUserPermission, Permission, User
+from plugins.review.checker import black_list
+from . import measure_async, memory_db, report
+
+
+async def fill(users: int, blacks: int):
+    await User.bulk_create([User(uid=uid, username=str(uid)) for uid in range(users)])
+    await ForumUserPermission.bulk_create([
+        ForumUserPermission(
+            fid=1, fname="test", user_id=uid,
+            permission=Permission.Black.value if uid < blacks else Permission.Ordinary.value,
+        )
+        for uid in range(users)
+    ])
+
+
+async def main():
+    random.seed(0)
+    async with memory_db():
+        await fill(10000, 1000)
+        uids = [random.randrange(20000) for _ in range(300)]
+
+        async def query():
+            for uid in uids:
+                await ForumUserPermission.filter(user_id=uid, permission=Permission.Black.value).get_or_none()
+
+        async def cached():
+            for uid in uids:
+                _ = uid in await black_list.get()
+
+        await black_list.get()
+        query_cost = await measure_async(query, 5) / len(uids)
+        cached_cost = await measure_async(cached, 5) / len(uids)
+        report("check_black per object, 10000 permissions, 1000 black", [
+            ("db query", query_cost),
+            ("cached set", cached_cost),
+        ])
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
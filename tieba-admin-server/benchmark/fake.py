@@ -0,0 +1,290 @@
+"""
+不访问网络的贴吧客户端替身
+
+FakeForum生成并逐轮演化一个合成的贴吧，FakeClient按aiotieba.Client的接口返回其内容，
+返回值使用aiotieba的真实数据类，checker与Executor的行为和线上一致
+"""
+import asyncio
+import random
+import string
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from aiotieba.api._classdef.contents import FragText
+from aiotieba.api._classdef.user import UserInfo
+from aiotieba.api.get_comments._classdef import Comment, Comments, Contents_c, UserInfo_c
+from aiotieba.api.get_posts._classdef import Comment_p, Contents_p, Contents_pc, Post, Posts, UserInfo_p
+from aiotieba.api.get_threads._classdef import Contents_t, Thread, Threads, UserInfo_t
+from aiotieba.enums import PostSortType
+from aiotieba.exception import BoolResponse, TiebaServerError
+
+CHARS = string.ascii_lowercase + "的一是了我不人在他有这个上们来到时大地为子中你说生国年着就那和要她出也得里后自以会"
+FID = 1
+PAGE_SIZE = 30
+COMMENT_PAGE_SIZE = 30
+
+
+@dataclass
+class FakeUser:
+    user_id: int
+    level: int
+
+    @property
+    def name(self):
+        return f"user{self.user_id}"
+
+
+@dataclass
+class FakeComment:
+    pid: int
+    floor: int
+    user: FakeUser
+    text: str
+    create_time: int
+
+
+@dataclass
+class FakePost:
+    pid: int
+    floor: int
+    user: FakeUser
+    text: str
+    create_time: int
+    comments: List[FakeComment] = field(default_factory=list)
+
+
+@dataclass
+class FakeThread:
+    tid: int
+    user: FakeUser
+    title: str
+    text: str
+    create_time: int
+    last_time: int
+    posts: List[FakePost] = field(default_factory=list)
+
+
+class FakeForum(object):
+    """
+    合成的贴吧
+
+    初始生成threads个主题贴，每个主题贴posts个楼层，每个楼层comments个楼中楼；
+    每次tick后时间前进interval秒，新增new_threads个主题贴，并向随机的主题贴、楼层追加回复
+
+    Attributes:
+        keyword_rate: 文本中混入keywords的概率
+        black_rate: 发言者为黑名单用户的概率
+        flood_rate: 文本为flood_texts条刷屏文本之一的概率
+    """
+
+    def __init__(self, fname: str = "benchmark", threads: int = 30, posts: int = 20, comments: int = 5,
+                 new_threads: int = 2, new_posts: int = 20, new_comments: int = 20,
+                 users: int = 1000, keywords: List[str] = (), keyword_rate: float = 0.02,
+                 black_users: List[int] = (), black_rate: float = 0.01, flood_rate: float = 0.0,
+                 flood_texts: int = 5, interval: int = 30, seed: int = 0):
+        self.fname = fname
+        self.rand = random.Random(seed)
+        self.now = 1700000000
+        self.interval = interval
+        self.new_threads = new_threads
+        self.new_posts = new_posts
+        self.new_comments = new_comments
+        self.keywords = list(keywords)
+        self.keyword_rate = keyword_rate
+        self.black_users = list(black_users)
+        self.black_rate = black_rate
+        self.flood_rate = flood_rate
+        self.users = [FakeUser(user_id=10000 + i, level=self.rand.randint(1, 18)) for i in range(users)]
+        self.threads: Dict[int, FakeThread] = {}
+        self._next_id = 1000000
+        self.flood_texts: List[str] = []
+        self.flood_texts = [self._text() for _ in range(flood_texts)] if flood_rate else []
+
+        for _ in range(threads):
+            thread = self.add_thread()
+            for _ in range(posts):
+                post = self.add_post(thread)
+                for _ in range(comments):
+                    self.add_comment(thread, post)
+
+    def _id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def _user(self) -> FakeUser:
+        if self.black_users and self.rand.random() < self.black_rate:
+            return FakeUser(user_id=self.rand.choice(self.black_users), level=1)
+        return self.rand.choice(self.users)
+
+    def _text(self) -> str:
+        if self.flood_texts and self.rand.random() < self.flood_rate:
+            return self.rand.choice(self.flood_texts)
+        text = ''.join(self.rand.choices(CHARS, k=self.rand.randint(5, 120)))
+        if self.keywords and self.rand.random() < self.keyword_rate:
+            pos = self.rand.randint(0, len(text))
+            text = text[:pos] + self.rand.choice(self.keywords) + text[pos:]
+        return text
+
+    def add_thread(self) -> FakeThread:
+        thread = FakeThread(tid=self._id(), user=self._user(), title=self._text()[:30], text=self._text(),
+                            create_time=self.now, last_time=self.now)
+        thread.posts.append(FakePost(pid=self._id(), floor=1, user=thread.user, text=thread.text,
+                                     create_time=self.now))
+        self.threads[thread.tid] = thread
+        return thread
+
+    def add_post(self, thread: FakeThread) -> FakePost:
+        post = FakePost(pid=self._id(), floor=thread.posts[-1].floor + 1, user=self._user(),
+                        text=self._text(), create_time=self.now)
+        thread.posts.append(post)
+        thread.last_time = self.now
+        return post
+
+    def add_comment(self, thread: FakeThread, post: FakePost) -> FakeComment:
+        comment = FakeComment(pid=self._id(), floor=len(post.comments) + 1, user=self._user(),
+                              text=self._text(), create_time=self.now)
+        post.comments.append(comment)
+        thread.last_time = self.now
+        return comment
+
+    def tick(self):
+        """
+        时间前进一轮，产生新的主题贴和回复
+        """
+        self.now += self.interval
+        for _ in range(self.new_threads):
+            self.add_thread()
+        threads = list(self.threads.values())
+        for _ in range(self.new_posts):
+            self.add_post(self.rand.choice(threads))
+        for _ in range(self.new_comments):
+            thread = self.rand.choice(threads)
+            self.add_comment(thread, self.rand.choice(thread.posts[1:] or thread.posts))
+
+    def front_page(self) -> List[FakeThread]:
+        return sorted(self.threads.values(), key=lambda t: t.last_time, reverse=True)[:PAGE_SIZE]
+
+
+def _texts(text: str):
+    return [FragText(text)]
+
+
+class FakeClient(object):
+    """
+    按aiotieba.Client的接口返回FakeForum中内容的客户端
+
+    Attributes:
+        latency: 每次请求的平均延迟（单位：秒），实际延迟服从指数分布
+        error_rate: 请求返回贴吧错误的概率
+        calls: 各接口的调用次数
+    """
+
+    def __init__(self, forum: FakeForum, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.forum = forum
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rand = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.broken = False
+
+    async def _request(self, name: str) -> Optional[Exception]:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.rand.expovariate(1 / self.latency))
+        else:
+            await asyncio.sleep(0)
+        if self.error_rate and self.rand.random() < self.error_rate:
+            return TiebaServerError(-1, "fake error")
+        return None
+
+    def _thread(self, thread: FakeThread) -> Thread:
+        user = UserInfo_t(user_id=thread.user.user_id, portrait=f"tb.{thread.user.user_id}",
+                          user_name=thread.user.name, level=thread.user.level)
+        return Thread(contents=Contents_t(objs=_texts(thread.text), texts=_texts(thread.text)),
+                      title=thread.title, fid=FID, fname=self.forum.fname, tid=thread.tid,
+                      pid=thread.posts[0].pid, user=user, author_id=user.user_id,
+                      reply_num=len(thread.posts) - 1, create_time=thread.create_time, last_time=thread.last_time)
+
+    def _comment_p(self, thread: FakeThread, post: FakePost, comment: FakeComment) -> Comment_p:
+        user = UserInfo_p(user_id=comment.user.user_id, portrait=f"tb.{comment.user.user_id}",
+                          user_name=comment.user.name, level=comment.user.level)
+        return Comment_p(contents=Contents_pc(objs=_texts(comment.text), texts=_texts(comment.text)),
+                         fid=FID, fname=self.forum.fname, tid=thread.tid, ppid=post.pid, pid=comment.pid,
+                         user=user, author_id=user.user_id, floor=comment.floor, create_time=comment.create_time)
+
+    def _post(self, thread: FakeThread, post: FakePost, comment_rn: int) -> Post:
+        user = UserInfo_p(user_id=post.user.user_id, portrait=f"tb.{post.user.user_id}",
+                          user_name=post.user.name, level=post.user.level)
+        comments = [self._comment_p(thread, post, c) for c in post.comments[:comment_rn]]
+        return Post(contents=Contents_p(objs=_texts(post.text), texts=_texts(post.text)), comments=comments,
+                    fid=FID, fname=self.forum.fname, tid=thread.tid, pid=post.pid, user=user,
+                    author_id=user.user_id, floor=post.floor, reply_num=len(post.comments),
+                    create_time=post.create_time)
+
+    async def get_threads(self, fname: str, *args, **kwargs) -> Threads:
+        if err := await self._request("get_threads"):
+            threads = Threads()
+            threads.err = err
+            return threads
+        return Threads(objs=[self._thread(t) for t in self.forum.front_page()])
+
+    async def get_posts(self, tid: int, pn: int = 1, rn: int = PAGE_SIZE, sort: PostSortType = PostSortType.ASC,
+                        with_comments: bool = False, comment_rn: int = 4, *args, **kwargs) -> Posts:
+        err = await self._request("get_posts")
+        thread = self.forum.threads.get(tid)
+        if err or thread is None:
+            posts = Posts()
+            posts.err = err
+            return posts
+        comment_rn = comment_rn if with_comments else 0
+        if sort == PostSortType.DESC:
+            ordered = thread.posts[::-1]
+        elif sort == PostSortType.HOT:
+            ordered = sorted(thread.posts, key=lambda p: len(p.comments), reverse=True)
+        else:
+            ordered = thread.posts
+        # 倒序时pn=0xFFFF表示最新一页
+        start = 0 if pn == 0xFFFF else (pn - 1) * rn
+        selected = ordered[start:start + rn]
+        return Posts(objs=[self._post(thread, p, comment_rn) for p in selected])
+
+    async def get_comments(self, tid: int, pid: int, pn: int = 1, *args, **kwargs) -> Comments:
+        err = await self._request("get_comments")
+        thread = self.forum.threads.get(tid)
+        post = next((p for p in thread.posts if p.pid == pid), None) if thread else None
+        if err or post is None:
+            comments = Comments()
+            comments.err = err
+            return comments
+        objs = []
+        for c in post.comments[(pn - 1) * COMMENT_PAGE_SIZE:][:COMMENT_PAGE_SIZE]:
+            user = UserInfo_c(user_id=c.user.user_id, portrait=f"tb.{c.user.user_id}",
+                              user_name=c.user.name, level=c.user.level)
+            objs.append(Comment(contents=Contents_c(objs=_texts(c.text), texts=_texts(c.text)),
+                                fid=FID, fname=self.forum.fname, tid=tid, ppid=pid, pid=c.pid, user=user,
+                                floor=c.floor, create_time=c.create_time))
+        return Comments(objs=objs)
+
+    async def get_self_info(self, *args, **kwargs) -> UserInfo:
+        await self._request("get_self_info")
+        return UserInfo(user_id=1, user_name="benchmark")
+
+    async def _write(self, name: str) -> BoolResponse:
+        rst = BoolResponse()
+        rst.err = await self._request(name)
+        return rst
+
+    async def block(self, *args, **kwargs):
+        return await self._write("block")
+
+    async def add_bawu_blacklist(self, *args, **kwargs):
+        return await self._write("add_bawu_blacklist")
+
+    async def hide_thread(self, *args, **kwargs):
+        return await self._write("hide_thread")
+
+    async def del_thread(self, *args, **kwargs):
+        return await self._write("del_thread")
+
+    async def del_post(self, *args, **kwargs):
+        return await self._write("del_post")
@@ -0,0 +1,35 @@
+"""
+对比多索引哈希表与逐个计算汉明距离查找相似图片哈希的耗时
+"""
+import random
+
+from plugins.review.imagehash import HashIndex
+from . import measure, report
+
+
+def near(value: int, distance: int) -> int:
+    for bit in random.sample(range(64), distance):
+        value ^= 1 << bit
+    return value
+
+
+def linear(hashes, value, max_distance):
+    return min(((h, (h ^ value).bit_count()) for h in hashes), key=lambda i: i[1])[1] <= max_distance
+
+
+def main():
+    random.seed(0)
+    for n in (1000, 10000, 100000):
+        hashes = [random.getrandbits(64) for _ in range(n)]
+        queries = [near(random.choice(hashes), random.randint(0, 6)) for _ in range(50)]
+        queries += [random.getrandbits(64) for _ in range(50)]
+        for max_distance in (6, 10):
+            index = HashIndex(hashes, max_distance)
+            report(f"{n} hashes, max distance {max_distance}, per query", [
+                ("linear scan", measure(lambda: [linear(hashes, q, max_distance) for q in queries], 1) / len(queries)),
+                ("HashIndex.search", measure(lambda: [index.search(q) for q in queries], 5) / len(queries)),
+            ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+对比Aho-Corasick关键词匹配与逐个关键词str.find的耗时
+"""
+import random
+import string
+
+from plugins.review.matcher import KeywordMatcher
+from . import measure, report
+
+CHARS = string.ascii_lowercase + "加微信代刷单兼职日结群免费领取"
+
+
+def random_text(length: int) -> str:
+    return ''.join(random.choices(CHARS, k=length))
+
+
+def find_loop(keywords, text):
+    for kw in keywords:
+        if text.find(kw) != -1:
+            return True
+    return False
+
+
+def find_loop_all(keywords, text):
+    return {kw for kw in keywords if text.find(kw) != -1}
+
+
+def main():
+    random.seed(0)
+    texts = [random_text(random.randint(10, 300)) for _ in range(300)]
+    for n in (10, 100, 1000, 5000):
+        keywords = list({random_text(random.randint(4, 8)) for _ in range(n)})
+        matcher = KeywordMatcher(keywords)
+        report(f"{len(keywords)} keywords, {len(texts)} texts", [
+            ("str.find all", measure(lambda: [find_loop_all(keywords, t) for t in texts], 5)),
+            ("str.find first", measure(lambda: [find_loop(keywords, t) for t in texts], 5)),
+            ("KeywordMatcher.findall", measure(lambda: [matcher.findall(t) for t in texts], 5)),
+            ("KeywordMatcher.search", measure(lambda: [matcher.search(t) for t in texts], 5)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
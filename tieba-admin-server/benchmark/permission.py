@@ -0,0 +1,47 @@
+"""
+对比权限列表逐行查询账号与联表查询的耗时和查询次数
+"""
+import asyncio
+
+from core.models import ForumUserPermission, Permission, User
+from . import QueryCounter, measure_async, memory_db, report
+
+
+async def fill(rows: int):
+    await User.bulk_create([User(uid=uid, username=str(uid)) for uid in range(rows)])
+    await ForumUserPermission.bulk_create([
+        ForumUserPermission(fid=uid % 10, fname=f"forum{uid % 10}", user_id=uid,
+                            permission=Permission.Ordinary.value)
+        for uid in range(rows)
+    ])
+
+
+async def per_row():
+    rst = []
+    for fup in await ForumUserPermission.all():
+        t = {"fid": fup.fid, "fname": fup.fname, "permission": fup.permission}
+        t.update((await fup.user.get()).to_dict())
+        rst.append(t)
+    return rst
+
+
+async def main():
+    async with memory_db():
+        await fill(10000)
+        assert await per_row() == await ForumUserPermission.list_dict()
+
+        with QueryCounter() as per_row_counter:
+            await per_row()
+        with QueryCounter() as joined_counter:
+            await ForumUserPermission.list_dict()
+
+        per_row_cost = await measure_async(per_row, 1)
+        joined_cost = await measure_async(ForumUserPermission.list_dict, 5)
+        report("list 10000 permissions", [
+            (f"per row, {per_row_counter.count} queries", per_row_cost),
+            (f"select_related, {joined_counter.count} queries", joined_cost),
+        ])
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+使用FakeClient驱动Reviewer.check_threads的端到端性能测试，不访问网络
+
+    python -m benchmark.review --threads 30 --posts 20 --cycles 50 --latency 0.01
+
+第一轮所有内容都是新的，单独统计；之后每轮FakeForum产生一批新内容，统计稳定状态下的
+每秒处理对象数、每个新对象的SQL语句数、内存峰值及每轮耗时的p50/p99
+"""
+import argparse
+import asyncio
+import math
+import time
+import tracemalloc
+from typing import List
+
+from core.cache import caches
+from core.models import ForumUserPermission, Permission, User
+from plugins.review.checker import manager
+from plugins.review.models import Function as RFunction
+from plugins.review.models import Keyword
+from plugins.review.reviewer import Reviewer
+from . import QueryCounter, memory_db
+from .fake import FakeClient, FakeForum
+
+KEYWORDS = ["加微信", "代刷", "兼职日结", "免费领取", "私聊"]
+BLACK_USERS = list(range(1, 51))
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * p / 100) - 1)]
+
+
+async def prepare():
+    """
+    启用所有checker，写入关键词与黑名单
+    """
+    await RFunction.bulk_create([RFunction(function=name, enable=True) for name in manager.check_name_map])
+    await Keyword.bulk_create([Keyword(keyword=k) for k in KEYWORDS])
+    await User.bulk_create([User(uid=uid, username=str(uid)) for uid in BLACK_USERS])
+    await ForumUserPermission.bulk_create([
+        ForumUserPermission(fid=1, fname="benchmark", user_id=uid, permission=Permission.Black.value)
+        for uid in BLACK_USERS
+    ])
+    await caches.sync()
+
+
+async def main(args):
+    forum = FakeForum(threads=args.threads, posts=args.posts, comments=args.comments,
+                      new_threads=args.new_threads, new_posts=args.new_posts, new_comments=args.new_comments,
+                      keywords=KEYWORDS, black_users=BLACK_USERS, flood_rate=args.flood_rate, seed=args.seed)
+    client = FakeClient(forum, latency=args.latency, error_rate=args.error_rate, seed=args.seed)
+
+    async with memory_db():
+        await prepare()
+        reviewer = Reviewer()
+        reviewer.no_exec = not args.exec
+        await reviewer.start_pipeline()
+
+        tracemalloc.start()
+        cycles = []
+        for i in range(args.cycles + 1):
+            if i:
+                forum.tick()
+            with QueryCounter() as counter:
+                start = time.perf_counter()
+                objects = await reviewer.check_threads(client, forum.fname)
+                cost = time.perf_counter() - start
+            cycles.append((objects, counter.count, cost))
+        await reviewer.stop_pipeline()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def summary(name, rows):
+        objects = sum(r[0] for r in rows)
+        queries = sum(r[1] for r in rows)
+        cost = sum(r[2] for r in rows)
+        times = [r[2] * 1000 for r in rows]
+        print(f"{name:<8}{len(rows):>7}{objects:>9}{objects / cost:>12.1f}{queries:>9}{queries / max(objects, 1):>10.3f}"
+              f"{percentile(times, 50):>10.1f}{percentile(times, 99):>10.1f}")
+
+    print(f"== review {args.threads} threads x {args.posts} posts x {args.comments} comments, "
+          f"latency {args.latency}s, error rate {args.error_rate}, exec {args.exec}")
+    print(f"{'':<8}{'cycles':>7}{'objects':>9}{'objects/s':>12}{'sql':>9}{'sql/obj':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    summary("cold", cycles[:1])
+    if len(cycles) > 1:
+        summary("steady", cycles[1:])
+    print(f"peak memory {peak / 1024 / 1024:.1f} MiB")
+    print("requests " + ", ".join(f"{k}={v}" for k, v in sorted(client.calls.items())))
+    print("verdict cache " + ", ".join(f"{k}={v}" for k, v in reviewer.verdicts.stats().items()))
+    print(f"{'checker':<24}{'calls':>8}{'hit rate':>10}{'avg ms':>10}{'total ms':>12}")
+    for name, stat in sorted(manager.stats_json().items(), key=lambda i: -i[1]["time_total"]):
+        print(f"{name:<24}{stat['calls']:>8}{stat['hit_rate']:>10.2%}{stat['time_avg']:>10.3f}{stat['time_total']:>12.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=30, help="初始主题贴数")
+    parser.add_argument("--posts", type=int, default=20, help="每个主题贴的初始楼层数")
+    parser.add_argument("--comments", type=int, default=5, help="每个楼层的初始楼中楼数")
+    parser.add_argument("--new-threads", type=int, default=2, help="每轮新增主题贴数")
+    parser.add_argument("--new-posts", type=int, default=20, help="每轮新增楼层数")
+    parser.add_argument("--new-comments", type=int, default=20, help="每轮新增楼中楼数")
+    parser.add_argument("--cycles", type=int, default=20, help="第一轮之后的轮数")
+    parser.add_argument("--latency", type=float, default=0.0, help="请求平均延迟（单位：秒）")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="文本为重复刷屏内容的概率")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="请求出错的概率")
+    parser.add_argument("--exec", action="store_true", help="经分发器执行吧务操作")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
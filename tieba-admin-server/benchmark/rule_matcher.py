@@ -0,0 +1,46 @@
+"""
+对比逐条执行正则规则与RuleMatcher合并正则的耗时
+"""
+import random
+import re
+import string
+from types import SimpleNamespace
+
+from plugins.review.matcher import RuleMatcher
+from . import measure, report
+
+CHARS = string.ascii_lowercase + "加微信代刷单兼职日结群免费领取"
+
+
+def random_text(length: int) -> str:
+    return ''.join(random.choices(CHARS, k=length))
+
+
+def random_rule(i: int) -> SimpleNamespace:
+    a, b = random_text(2), random_text(2)
+    return SimpleNamespace(id=i, pattern=f"{a}[\\s\\W]*{b}\\d*", types="thread,post,comment",
+                           min_level=random.choice((1, 1, 4)), max_level=random.choice((3, 18, 18)))
+
+
+def loop(rules, level, text):
+    for rule, pattern in rules:
+        if rule.min_level <= level <= rule.max_level and pattern.search(text):
+            return rule
+    return None
+
+
+def main():
+    random.seed(0)
+    texts = [(random.randint(1, 18), random_text(random.randint(10, 300))) for _ in range(300)]
+    for n in (10, 100, 500, 2000):
+        rules = [random_rule(i) for i in range(n)]
+        compiled = [(r, re.compile(r.pattern)) for r in rules]
+        matcher = RuleMatcher(rules)
+        report(f"{n} rules, {len(texts)} texts", [
+            ("re.search per rule", measure(lambda: [loop(compiled, lv, t) for lv, t in texts], 5)),
+            ("RuleMatcher.search", measure(lambda: [matcher.search("post", lv, t) for lv, t in texts], 5)),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
-﻿import aiotieba
-from sanic import Blueprint, Request
+﻿from sanic import Blueprint, Request
 from sanic_jwt import inject_user, protected, scoped
 
+from core.cache import caches
+from core.client import Client, clients
 from core.exception import ArgException, FirstLoginError
 from core.models import Permission, User, Config, ForumUserPermission
 from core.utils import json, validate_password
@@ -17,8 +18,8 @@ async def get_portrait(rqt: Request, user: User):
     """获取用于获取贴吧用户头像的portrait值
 
     """
-    async with aiotieba.Client() as client:
-        _user = await client.get_user_info(user.uid)
+    client = await clients.get()
+    _user = await client.get_user_info(user.uid)
     return json(data=_user.portrait)
 
 
@@ -37,7 +38,7 @@ async def first_login_api(rqt: Request):
     validate_password(rqt.form.get('password'))
 
     try:
-        async with aiotieba.Client(rqt.form.get('BDUSS'), rqt.form.get('STOKEN')) as client:
+        async with Client(rqt.form.get('BDUSS'), rqt.form.get('STOKEN')) as client:
             user = await client.get_self_info()
             fid = await client.get_fid(rqt.form.get('fname'))
     except ValueError as e:
@@ -56,6 +57,7 @@ async def first_login_api(rqt: Request):
         user=user,
         permission=Permission.Master.value,
     )
+    await caches.bump("permission")
     await Config.set_config(key="first", v1=False)
     return json("成功创建超级管理员")
 
@@ -74,7 +76,7 @@ async def change_password(rqt: Request, user: User):
 
     validate_password(rqt.form.get("password"))
     user.password = rqt.app.shared_ctx.password_hasher.hash(rqt.form.get('password'))
-    await user.save()
+    await user.save(update_fields=["password"])
     return json("修改密码成功")
 
 
@@ -86,5 +88,5 @@ async def get_self_full(rqt: Request, user: User):
     """获取完整个人信息
 
     """
-    fup = await ForumUserPermission.get(user_id=user.uid)
-    return json(data=await fup.to_dict())
+    fup = await ForumUserPermission.filter(user_id=user.uid).select_related("user").get()
+    return json(data=fup.to_dict())
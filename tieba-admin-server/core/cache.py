@@ -0,0 +1,155 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Coroutine, Any, Dict, Optional, Hashable, Tuple
+
+from sanic.log import logger
+
+from .models import Config
+from .utils import generate_random_string
+
+Loader = Callable[[], Coroutine[Any, Any, Any]]
+
+
+class TTLCache(object):
+    """
+    带过期时间的简单缓存
+
+    所有条目的有效期相同，按写入顺序排列即按过期时间排列，写入时顺带清除已过期的条目，
+    超过容量时丢弃最早写入的条目
+
+    Attributes:
+        ttl: 过期时间（单位：秒）
+        maxsize: 最多保存的条目数
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if item[0] < time.monotonic():
+            del self._data[key]
+            return default
+        return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        now = time.monotonic()
+        self._data.pop(key, None)
+        self._data[key] = (now + self.ttl, value)
+        while self._data:
+            oldest_key, (expire, _) = next(iter(self._data.items()))
+            if expire >= now and len(self._data) <= self.maxsize:
+                break
+            del self._data[oldest_key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
+class VersionCache(object):
+    """
+    由版本号驱动的进程内缓存
+
+    接口进程与插件进程不共享内存，数据变更时通过 ``CacheManager.bump`` 往Config表写入新的版本号，
+    其他进程调用 ``CacheManager.sync`` 比较版本号，只重新加载发生变化的缓存
+
+    Attributes:
+        name: 缓存名
+        key: 在Config表中记录版本号的键，多个缓存可以关注同一个键
+        version: 当前已加载数据对应的版本号
+        value: 缓存的数据
+    """
+
+    def __init__(self, name: str, key: str, loader: Loader):
+        self.name = name
+        self.key = key
+        self.version: Optional[str] = None
+        self.value: Any = None
+        self.loaded = False
+        self._loader = loader
+
+    async def get(self):
+        """
+        获取缓存数据，未加载时先加载
+        """
+        if not self.loaded:
+            await self.reload(self.version)
+        return self.value
+
+    async def get_fresh(self):
+        """
+        通过Config缓存比较版本号，版本号变化或者尚未加载时重新加载
+
+        Config缓存在接口进程间共享版本号，数据未变更时不访问数据库，适合在每个请求中调用
+        """
+        version = await Config.get_str(self.key)
+        if not self.loaded or self.version != version:
+            await self.reload(version)
+        return self.value
+
+    async def reload(self, version: Optional[str] = None):
+        self.value = await self._loader()
+        self.version = version
+        self.loaded = True
+        logger.debug(f"[cache] {self.name} reloaded")
+
+    def invalidate(self):
+        self.loaded = False
+
+
+class CacheManager:
+    def __init__(self):
+        self.caches: Dict[str, VersionCache] = {}
+
+    @staticmethod
+    def version_key(version: str) -> str:
+        return f"VER_{version.upper()}"
+
+    def register(self, name: str, version: str = None):
+        """
+        注册一个缓存，被装饰的函数为其加载方法
+        Args:
+            name: 缓存名
+            version: 关注的版本名，默认与缓存名相同
+        """
+
+        def wrapper(func: Loader):
+            cache = VersionCache(name, self.version_key(version or name), func)
+            self.caches[name] = cache
+            return cache
+
+        return wrapper
+
+    async def bump(self, *versions: str):
+        """
+        数据已变更，使本进程中关注这些版本的缓存失效并通知其他进程
+        Args:
+            versions: 版本名
+        """
+        for version in versions:
+            key = self.version_key(version)
+            for cache in self.caches.values():
+                if cache.key == key:
+                    cache.invalidate()
+            await Config.set_config(key, generate_random_string(8))
+
+    async def sync(self):
+        """
+        使用一次查询读取所有版本号，重新加载版本号变化或者尚未加载的缓存
+        """
+        keys = {c.key for c in self.caches.values()}
+        versions = dict(await Config.filter(key__in=list(keys)).values_list("key", "v1"))
+        for cache in self.caches.values():
+            version = versions.get(cache.key)
+            if not cache.loaded or cache.version != version:
+                await cache.reload(version)
+
+
+caches = CacheManager()
@@ -0,0 +1,264 @@
+import asyncio
+import random
+import time
+from enum import Enum
+from typing import Any, Dict, Tuple, Callable, Coroutine
+
+import aiohttp
+import aiotieba
+from aiotieba.enums import ReqUInfo
+from aiotieba.exception import TiebaServerError, HTTPStatusError
+from sanic.log import logger
+
+from . import env
+from .cache import TTLCache
+
+# 贴吧返回的未登录/登录失效错误码
+AUTH_ERROR_CODES = {1, }
+# 贴吧返回的操作过快错误码
+RATE_LIMIT_ERROR_CODES = {220034, 340011}
+
+
+def is_fatal(err: Exception) -> bool:
+    """
+    判断错误是否需要重建客户端，即鉴权失败或者网络错误
+    """
+    if isinstance(err, TiebaServerError):
+        return err.code in AUTH_ERROR_CODES
+    return isinstance(err, (aiohttp.ClientError, asyncio.TimeoutError, HTTPStatusError))
+
+
+def is_rate_limited(err: Exception) -> bool:
+    """
+    判断错误是否为请求过快
+    """
+    if isinstance(err, TiebaServerError):
+        return err.code in RATE_LIMIT_ERROR_CODES
+    if isinstance(err, HTTPStatusError):
+        return err.code == 429
+    return False
+
+
+def is_retryable(err: Exception) -> bool:
+    """
+    判断错误是否值得重试，即请求过快、网络错误或者服务器错误
+    """
+    if isinstance(err, HTTPStatusError):
+        return err.code == 429 or err.code >= 500
+    return is_rate_limited(err) or isinstance(err, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class TokenBucket(object):
+    """
+    令牌桶，限制平均请求速率并允许一定的突发
+
+    Attributes:
+        rate: 每秒生成的令牌数
+        burst: 令牌桶容量
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._last = time.monotonic()
+        self._pause_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        """
+        等待并取走一个令牌，等待者按先后顺序获得令牌
+        """
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._pause_until:
+                    await asyncio.sleep(self._pause_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        暂停发放令牌，用于被贴吧限速后让所有请求一起退避
+        """
+        self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+class Bucket(Enum):
+    """
+    限速桶类型
+
+    Attributes:
+        READ: 读取内容
+        WRITE: 删贴、封禁等吧务操作
+    """
+    READ = "read"
+    WRITE = "write"
+
+
+class RateLimiter(object):
+    """
+    读取与吧务操作分开限速，出错时带随机抖动的指数退避重试
+
+    Attributes:
+        buckets: 各类型的令牌桶
+        retries: 最大重试次数
+        base_delay: 首次退避时间（单位：秒）
+        max_delay: 最长退避时间（单位：秒）
+    """
+
+    def __init__(self, read_rate: float, write_rate: float, burst: int, retries: int,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.buckets: Dict[Bucket, TokenBucket] = {
+            Bucket.READ: TokenBucket(read_rate, burst),
+            Bucket.WRITE: TokenBucket(write_rate, burst),
+        }
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def call(self, bucket: Bucket, func: Callable[..., Coroutine[Any, Any, Any]], *args, **kwargs):
+        """
+        在限速下调用aiotieba的接口，返回值带有可重试的err时退避后重试
+        Args:
+            bucket: 限速桶类型
+            func: aiotieba.Client的方法
+        """
+        token_bucket = self.buckets[bucket]
+        attempt = 0
+        while True:
+            await token_bucket.acquire()
+            rst = await func(*args, **kwargs)
+            err = getattr(rst, "err", None)
+            if err is None or attempt >= self.retries or not is_retryable(err):
+                return rst
+            delay = self.backoff(attempt)
+            if is_rate_limited(err):
+                token_bucket.pause(delay)
+            logger.warning(f"[client] {bucket.value} request failed: {err!r}, retry in {delay:.1f}s")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+limiter = RateLimiter(env.TIEBA_READ_RATE, env.TIEBA_WRITE_RATE, env.TIEBA_BURST, env.TIEBA_RETRIES)
+
+
+class Client(aiotieba.Client):
+    """
+    限速并缓存了稳定信息的贴吧客户端
+
+    所有用到的接口都经过全局的RateLimiter；fid、贴吧名、本账号信息在有效期内只请求一次；
+    请求出现鉴权或网络错误时标记为broken，由ClientPool重建
+
+    Attributes:
+        broken: 是否需要重建
+        FID_TTL: fid与贴吧名缓存时间（单位：秒）
+        SELF_INFO_TTL: 本账号信息缓存时间（单位：秒）
+    """
+    FID_TTL = 24 * 60 * 60
+    SELF_INFO_TTL = 10 * 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.broken = False
+        self._forum_cache = TTLCache(self.FID_TTL)
+        self._self_info_cache = TTLCache(self.SELF_INFO_TTL)
+
+    async def _call(self, bucket: Bucket, func, *args, **kwargs):
+        rst = await limiter.call(bucket, func, *args, **kwargs)
+        if (err := getattr(rst, "err", None)) is not None and is_fatal(err):
+            self.broken = True
+        return rst
+
+    async def get_fid(self, fname: str):
+        if (fid := self._forum_cache.get(fname)) is None:
+            fid = await self._call(Bucket.READ, super().get_fid, fname)
+            if fid.err is None:
+                self._forum_cache.set(fname, fid)
+        return fid
+
+    async def get_fname(self, fid: int):
+        if (fname := self._forum_cache.get(fid)) is None:
+            fname = await self._call(Bucket.READ, super().get_fname, fid)
+            if fname.err is None:
+                self._forum_cache.set(fid, fname)
+        return fname
+
+    async def get_self_info(self, require: ReqUInfo = ReqUInfo.ALL):
+        if (user := self._self_info_cache.get(require)) is None:
+            user = await self._call(Bucket.READ, super().get_self_info, require)
+            if user.err is None:
+                self._self_info_cache.set(require, user)
+        return user
+
+    async def get_threads(self, *args, **kwargs):
+        return await self._call(Bucket.READ, super().get_threads, *args, **kwargs)
+
+    async def get_posts(self, *args, **kwargs):
+        return await self._call(Bucket.READ, super().get_posts, *args, **kwargs)
+
+    async def get_comments(self, *args, **kwargs):
+        return await self._call(Bucket.READ, super().get_comments, *args, **kwargs)
+
+    async def get_user_info(self, *args, **kwargs):
+        return await self._call(Bucket.READ, super().get_user_info, *args, **kwargs)
+
+    async def tieba_uid2user_info(self, *args, **kwargs):
+        return await self._call(Bucket.READ, super().tieba_uid2user_info, *args, **kwargs)
+
+    async def block(self, *args, **kwargs):
+        return await self._call(Bucket.WRITE, super().block, *args, **kwargs)
+
+    async def add_bawu_blacklist(self, *args, **kwargs):
+        return await self._call(Bucket.WRITE, super().add_bawu_blacklist, *args, **kwargs)
+
+    async def hide_thread(self, *args, **kwargs):
+        return await self._call(Bucket.WRITE, super().hide_thread, *args, **kwargs)
+
+    async def del_thread(self, *args, **kwargs):
+        return await self._call(Bucket.WRITE, super().del_thread, *args, **kwargs)
+
+    async def del_post(self, *args, **kwargs):
+        return await self._call(Bucket.WRITE, super().del_post, *args, **kwargs)
+
+
+class ClientPool:
+    """
+    按账号复用长期持有的贴吧客户端，客户端出现鉴权或网络错误后才重建
+    """
+
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], Client] = {}
+
+    async def get(self, BDUSS: str = '', STOKEN: str = '') -> Client:
+        key = (BDUSS, STOKEN)
+        client = self._clients.get(key)
+        if client is not None and client.broken:
+            logger.warning("[client] client broken, recreate it")
+            await client.__aexit__()
+            client = None
+        if client is None:
+            client = Client(BDUSS, STOKEN)
+            self._clients[key] = client
+        return client
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.__aexit__()
+        self._clients.clear()
+
+
+clients = ClientPool()
@@ -14,3 +14,7 @@ SECRET = env.str("SECRET", "This is a big secret!!!")
 DB_URL = env.str("DB_URL", f"sqlite://{CACHE_PATH}/{CACHE_FILE}")
 DEV = env.bool("DEV", False)
 TZ = env.str("TZ", "Asia/Shanghai")
+TIEBA_READ_RATE = env.float("TIEBA_READ_RATE", 10.0)
+TIEBA_WRITE_RATE = env.float("TIEBA_WRITE_RATE", 1.0)
+TIEBA_BURST = env.int("TIEBA_BURST", 5)
+TIEBA_RETRIES = env.int("TIEBA_RETRIES", 3)
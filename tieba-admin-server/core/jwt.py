@@ -1,13 +1,35 @@
 import base64
+from typing import Dict
 
 from sanic import Request
-from sanic_jwt import Configuration, Responses, exceptions
+from sanic_jwt import Authentication, Configuration, Responses, exceptions
 from sanic_jwt.exceptions import AuthenticationFailed
 
 from . import env
-from .models import User, ForumUserPermission
+from .cache import caches, TTLCache
+from .models import User, ForumUserPermission, Permission, Config
 from .utils import json
 
+# inject_user使用的用户缓存时间（单位：秒）
+USER_CACHE_TTL = 30
+user_cache = TTLCache(USER_CACHE_TTL)
+
+
+@caches.register("scope", version="permission")
+async def user_scopes() -> Dict[int, str]:
+    """
+    所有用户当前的权限，用户在多个吧有权限时取最高的一个
+
+    Returns:
+        uid -> 权限
+    """
+    order = Permission.all()
+    scopes = {}
+    for uid, permission in await ForumUserPermission.all().values_list("user_id", "permission"):
+        if uid not in scopes or order.index(permission) > order.index(scopes[uid]):
+            scopes[uid] = permission
+    return scopes
+
 
 async def authenticate(rqt: Request):
     if rqt.headers.get("Authorization"):
@@ -32,9 +54,19 @@ async def authenticate(rqt: Request):
 
 
 async def retrieve_user(rqt: Request, payload):
+    """
+    获取inject_user需要的用户对象
+
+    用户对象缓存USER_CACHE_TTL秒，权限版本号变化（修改、删除用户权限）时缓存立即失效
+    """
     try:
         uid = payload.get('uid', None)
+        version = await Config.get_str(caches.version_key("permission"))
+        cached = user_cache.get(uid)
+        if cached is not None and cached[0] == version:
+            return cached[1]
         user = await User.filter(uid=uid).get()
+        user_cache.set(uid, (version, user))
         return user
     except AttributeError:
         pass
@@ -42,6 +74,30 @@ async def retrieve_user(rqt: Request, payload):
         raise
 
 
+async def extend_payload(payload, user: User = None, *args, **kwargs):
+    """
+    将常用的用户信息写入token，前端和只需要这些信息的接口无需再查询用户
+    """
+    payload.update({"tuid": user.tuid, "username": user.username})
+    return payload
+
+
+class JwtAuthentication(Authentication):
+    async def extract_scopes(self, request):
+        """
+        校验通过后从缓存中读取用户当前的权限，而不是token签发时的权限
+
+        权限缓存只在权限版本号变化时重新加载，修改用户权限后已签发的token立即按新权限鉴权
+        """
+        payload = await self.extract_payload(request)
+        if not payload:
+            return None
+        permission = (await user_scopes.get_fresh()).get(payload.get(self.config.user_id()))
+        if permission is None:
+            return None
+        return [permission]
+
+
 class JwtConfig(Configuration):
     url_prefix = "/api/auth"
     path_to_retrieve_user = "/self"
@@ -71,5 +127,7 @@ class JwtResponse(Responses):
 
 
 async def scope_extender(user: User, *args, **kwargs):
-    p = await ForumUserPermission.get(user=user)
-    return p.permission
+    permission = (await user_scopes.get_fresh()).get(user.uid)
+    if permission is None:
+        raise AuthenticationFailed("该账号没有任何权限")
+    return permission
@@ -1,12 +1,14 @@
 ﻿import os
 import sys
+from datetime import datetime, timedelta
 
 from sanic import Blueprint, Request
 from sanic.log import LOGGING_CONFIG_DEFAULTS
 from sanic_jwt import protected, scoped
 
+from core.cache import TTLCache
 from core.exception import ArgException
-from core.models import Permission, ExecuteLog
+from core.models import Permission, ExecuteLog, ExecuteType
 from core.utils import json
 
 LOG_PATH = "./log"
@@ -46,10 +48,31 @@ LOGGING_CONFIG.update({
 bp_log = Blueprint("log", url_prefix="/api/logs")
 
 
+# 按筛选条件缓存的记录总数，翻页时不用每次都count整张表
+TOTAL_CACHE = TTLCache(60)
+
+
+def parse_time(s: str, end: bool = False) -> datetime:
+    """
+    解析 ``%Y-%m-%d %H:%M:%S`` 或 ``%Y-%m-%d`` 格式的时间，只有日期的结束时间取到第二天0点
+    """
+    try:
+        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        t = datetime.strptime(s, "%Y-%m-%d")
+        return t + timedelta(days=1) if end else t
+
+
 @bp_log.get("/exec")
 @protected()
 @scoped(Permission.min(), False)
 async def get_log(rqt: Request):
+    """获取操作记录
+
+    可按 type（ExecuteType的名字或值）、user、start、end 筛选。
+    传入 cursor 参数时按id从新到旧分页，cursor为空或0时获取第一页，之后传入上一页返回的next；
+    否则按 pn 分页
+    """
     try:
         limit = int(rqt.args.get("limit", 20))
 
@@ -58,8 +81,37 @@ async def get_log(rqt: Request):
         pn = int(rqt.args.get("pn", 1))
         if pn < 1:
             pn = 1
-    except (TypeError, ValueError):
+        cursor = rqt.args.get("cursor")
+        if cursor is not None:
+            cursor = int(cursor or 0)
+
+        filters = {}
+        if _type := rqt.args.get("type"):
+            filters["type"] = int(_type) if _type.isdecimal() else ExecuteType[_type].value
+        if user := rqt.args.get("user"):
+            filters["user"] = user
+        if start := rqt.args.get("start"):
+            filters["date_created__gte"] = parse_time(start)
+        if end := rqt.args.get("end"):
+            filters["date_created__lt"] = parse_time(end, end=True)
+    except (TypeError, ValueError, KeyError):
         raise ArgException
-    offset = (pn - 1) * limit
-    logs = await ExecuteLog.all().offset(offset).limit(limit)
-    return json(data={"items": [await log.to_dict() for log in logs], "total": await ExecuteLog.all().count()})
+
+    query = ExecuteLog.filter(**filters)
+    total_key = tuple(sorted((k, str(v)) for k, v in filters.items()))
+    total = TOTAL_CACHE.get(total_key)
+    if total is None:
+        total = await query.count()
+        TOTAL_CACHE.set(total_key, total)
+
+    next_cursor = None
+    if cursor is not None:
+        if cursor > 0:
+            query = query.filter(id__lt=cursor)
+        logs = await query.order_by("-id").limit(limit)
+        if len(logs) == limit:
+            next_cursor = logs[-1].id
+    else:
+        offset = (pn - 1) * limit
+        logs = await query.offset(offset).limit(limit)
+    return json(data={"items": [log.to_dict() for log in logs], "total": total, "next": next_cursor})
@@ -3,6 +3,8 @@ from sanic import Blueprint, Request
 from sanic.views import HTTPMethodView
 from sanic_jwt import protected, scoped, inject_user
 
+from .cache import caches
+from .client import clients
 from .exception import ArgException
 from .models import ForumUserPermission, Permission, User, ExecuteLog, ExecuteType
 from .utils import json, arg2user_info, validate_password
@@ -14,11 +16,7 @@ class UserPermission(HTTPMethodView):
     @protected()
     @scoped(Permission.min(), False)
     async def get(self, rqt: Request):
-        _permission = await ForumUserPermission.all()
-        permission = []
-        for p in _permission:
-            permission.append(await p.to_dict())
-        return json(data=permission)
+        return json(data=await ForumUserPermission.list_dict())
 
     @inject_user()
     @protected()
@@ -30,13 +28,14 @@ class UserPermission(HTTPMethodView):
             raise ArgException
 
         try:
-            async with aiotieba.Client() as client:
-                user_info = await arg2user_info(client, rqt.form.get("user"), aiotieba.enums.ReqUInfo.ALL)
-                forum_id = await client.get_fid(rqt.form.get("forum"))
+            client = await clients.get()
+            user_info = await arg2user_info(client, rqt.form.get("user"), aiotieba.enums.ReqUInfo.ALL)
+            forum_id = await client.get_fid(rqt.form.get("forum"))
 
             if rqt.form.get("del", "0") == "1":
                 await ForumUserPermission.filter(user_id=user_info.user_id, fid=forum_id).delete()
                 await User.filter(uid=user_info.user_id).delete()
+                await caches.bump("permission")
                 await ExecuteLog.create(user=user.username,
                                         type=ExecuteType.PermissionEdit,
                                         obj=user_info.user_name,
@@ -68,13 +67,15 @@ class UserPermission(HTTPMethodView):
 
             permission.permission = rqt.form.get("pm")
             await permission.save()
+            await caches.bump("permission")
 
             await ExecuteLog.create(user=user.username,
                                     type=ExecuteType.PermissionEdit,
                                     obj=user_info.user_name,
                                     note=f"设置[{user_info.user_name}]为 {permission.permission}")
 
-            return json(data=await permission.to_dict())
+            await permission.fetch_related("user")
+            return json(data=permission.to_dict())
         except ValueError:
             return json("没有该贴吧用户")
 
@@ -1,13 +1,14 @@
 import json
 import os
+import time
 from datetime import datetime
 from enum import IntEnum, unique, Enum
-from typing import Any, Optional
+from typing import Any, Optional, Dict, List
 
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 from sanic_jwt.exceptions import AuthenticationFailed
-from tortoise import Model, fields
+from tortoise import Model, connections, fields
 from tortoise.exceptions import DoesNotExist
 
 from . import env
@@ -71,29 +72,136 @@ class Permission(Enum):
         return [cls.Master.value, ]
 
 
+class ConfigCache(object):
+    """
+    Config表的进程内缓存
+
+    首次读取时加载整张表，之后读取不再访问数据库。
+    多个Sanic worker通过共享内存中的版本号保持一致：任一进程修改配置后版本号加一，其他进程读取时发现版本号变化即重新加载。
+    没有共享版本号的进程（如插件进程）缓存LOCAL_TTL秒后重新加载
+
+    Attributes:
+        data: 缓存的配置，key -> v1
+        shared: multiprocessing.Value，各进程共享的版本号
+        version: 已加载数据对应的版本号
+    """
+    LOCAL_TTL = 5
+
+    def __init__(self):
+        self.data: Optional[Dict[str, str]] = None
+        self.shared = None
+        self.version = 0
+        self._expire = 0.0
+
+    def share(self, value):
+        """
+        使用共享的版本号
+        Args:
+            value: multiprocessing.Value("i")
+        """
+        self.shared = value
+        self.invalidate()
+
+    def valid(self) -> bool:
+        if self.data is None:
+            return False
+        if self.shared is not None:
+            return self.shared.value == self.version
+        return time.monotonic() < self._expire
+
+    async def get(self, key: str) -> Optional[str]:
+        if not self.valid():
+            version = self.shared.value if self.shared is not None else 0
+            self.data = dict(await Config.all().values_list("key", "v1"))
+            self.version = version
+            self._expire = time.monotonic() + self.LOCAL_TTL
+        return self.data.get(key)
+
+    def invalidate(self):
+        """
+        使本进程缓存失效，并通知其他进程
+        """
+        self.data = None
+        if self.shared is not None:
+            with self.shared.get_lock():
+                self.shared.value += 1
+
+
+config_cache = ConfigCache()
+
+
 class Config(Model):
     """
     存储简单的配置的表
+
+    读取经过进程内缓存，只有修改时访问数据库
     """
-    key = fields.CharField(max_length=32)
+    key = fields.CharField(max_length=32, unique=True)
     v1 = fields.CharField(max_length=256)
 
     class Meta:
         table = "configs"
 
+    @staticmethod
+    async def get_str(key: str) -> Optional[str]:
+        return await config_cache.get(key)
+
     @staticmethod
     async def get_bool(key: str) -> Optional[bool]:
-        rst = await Config.filter(key=key).get_or_none()
-        if rst:
-            return rst.v1 == str(True)
+        rst = await config_cache.get(key)
+        if rst is not None:
+            return rst == str(True)
         else:
             return None
 
     @staticmethod
-    async def get_list(key: str) -> Optional[bool]:
-        rst = await Config.filter(key=key).get_or_none()
-        if rst:
-            return json.loads(rst.v1)
+    async def get_list(key: str) -> Optional[list]:
+        rst = await config_cache.get(key)
+        if rst is not None:
+            return json.loads(rst)
+
+    @staticmethod
+    async def migrate():
+        """
+        为旧数据库的configs表补上key的唯一索引
+
+        generate_schemas只创建不存在的表，不会给已有的表加约束。旧版本可能写入了重复的key，
+        先保留每个key最后写入的一行，再建立唯一索引
+        """
+        latest: Dict[str, int] = {}
+        duplicated: List[int] = []
+        for _id, key in await Config.all().order_by("id").values_list("id", "key"):
+            if key in latest:
+                duplicated.append(latest[key])
+            latest[key] = _id
+        if duplicated:
+            await Config.filter(id__in=duplicated).delete()
+
+        conn = connections.get("default")
+        if not await Config._has_unique_key(conn):
+            if conn.capabilities.dialect == "mysql":
+                await conn.execute_script("CREATE UNIQUE INDEX `uidx_configs_key` ON `configs` (`key`)")
+            else:
+                await conn.execute_script('CREATE UNIQUE INDEX "uidx_configs_key" ON "configs" ("key")')
+
+    @staticmethod
+    async def _has_unique_key(conn) -> bool:
+        """
+        key上是否已有唯一索引，新建的表由UNIQUE约束生成
+        """
+        dialect = conn.capabilities.dialect
+        if dialect == "sqlite":
+            for index in (await conn.execute_query('PRAGMA index_list("configs")'))[1]:
+                if index["unique"]:
+                    columns = (await conn.execute_query(f'PRAGMA index_info("{index["name"]}")'))[1]
+                    if [c["name"] for c in columns] == ["key"]:
+                        return True
+            return False
+        if dialect == "mysql":
+            sql = "SHOW INDEX FROM `configs` WHERE `Column_name` = 'key' AND `Non_unique` = 0"
+        else:
+            sql = "SELECT 1 FROM pg_indexes WHERE tablename = 'configs' AND indexdef LIKE 'CREATE UNIQUE INDEX % (key)'"
+        return bool((await conn.execute_query(sql))[1])
 
     @staticmethod
     async def set_config(key: str, v1: Any):
@@ -102,6 +210,7 @@ class Config(Model):
             rst = Config(key=key, v1=str(v1))
         rst.v1 = str(v1)
         await rst.save()
+        config_cache.invalidate()
 
 
 class User(Model):
@@ -174,15 +283,31 @@ class ForumUserPermission(Model):
     class Meta:
         table = "forum_user_permission"
 
-    async def to_dict(self):
+    def to_dict(self):
+        """
+        序列化权限及其账号信息，user需要已通过select_related或fetch_related加载
+        """
         t = {
             "fid": self.fid,
             "fname": self.fname,
             "permission": self.permission,
         }
-        t.update((await self.user.get()).to_dict())
+        t.update(self.user.to_dict())
         return t
 
+    @staticmethod
+    async def list_dict(**filters) -> List[Dict[str, Any]]:
+        """
+        使用一次联表查询读取权限及其账号信息，查询次数与行数无关
+        Args:
+            filters: 过滤条件
+
+        Returns:
+            List[Dict[str, Any]]
+        """
+        fups = await ForumUserPermission.filter(**filters).select_related("user")
+        return [fup.to_dict() for fup in fups]
+
 
 class ExecuteLog(Model):
     """
@@ -196,17 +321,17 @@ class ExecuteLog(Model):
         date_updated: 最后修改时间
     """
     id = fields.BigIntField(pk=True)
-    user = fields.CharField(64)
-    type = fields.IntField()
+    user = fields.CharField(64, index=True)
+    type = fields.IntField(index=True)
     obj = fields.CharField(64)
     note = fields.TextField(default="")
-    date_created: datetime = fields.DatetimeField(auto_now_add=True)
+    date_created: datetime = fields.DatetimeField(auto_now_add=True, index=True)
     date_updated: datetime = fields.DatetimeField(auto_now=True)
 
     class Meta:
         table = "execute_log"
 
-    async def to_dict(self):
+    def to_dict(self):
         return {
             "id": self.id,
             "user": self.user,
@@ -0,0 +1,68 @@
+import time
+import unittest
+
+from aiotieba.exception import BoolResponse, TiebaServerError
+
+from .cache import TTLCache
+from .client import RateLimiter, Bucket, TokenBucket
+
+
+class ClientTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_token_bucket(self):
+        bucket = TokenBucket(rate=100, burst=5)
+        start = time.monotonic()
+        for _ in range(15):
+            await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    async def test_retry(self):
+        limiter = RateLimiter(100, 100, 5, retries=2, base_delay=0.01)
+        calls = []
+
+        async def func():
+            calls.append(1)
+            rst = BoolResponse()
+            if len(calls) < 3:
+                rst.err = TiebaServerError(220034, "操作太快")
+            return rst
+
+        self.assertTrue(await limiter.call(Bucket.WRITE, func))
+        self.assertEqual(len(calls), 3)
+
+    async def test_no_retry(self):
+        limiter = RateLimiter(100, 100, 5, retries=2, base_delay=0.01)
+        calls = []
+
+        async def func():
+            calls.append(1)
+            rst = BoolResponse()
+            rst.err = TiebaServerError(300000, "参数错误")
+            return rst
+
+        self.assertFalse(await limiter.call(Bucket.READ, func))
+        self.assertEqual(len(calls), 1)
+
+    def test_ttl_cache(self):
+        cache = TTLCache(ttl=-1)
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+        cache.ttl = 60
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+
+    def test_ttl_cache_bounded(self):
+        cache = TTLCache(ttl=-1)
+        for i in range(100):
+            cache.set(i, i)
+        self.assertEqual(len(cache), 0)
+
+        cache = TTLCache(ttl=60, maxsize=3)
+        for i in range(5):
+            cache.set(i, i)
+        self.assertEqual(len(cache), 3)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(4), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from tortoise import Tortoise, connections
+from tortoise.exceptions import IntegrityError
+
+from .models import Config
+
+
+def _config(path: str):
+    return {
+        'connections': {
+            'default': f"sqlite://{path}"
+        },
+        'apps': {
+            'models': {
+                "models": [Config.__module__],
+                'default_connection': 'default',
+            }
+        },
+    }
+
+
+class ConfigMigrateTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        await Tortoise.init(config=_config(os.path.join(self.dir.name, "db.sqlite")))
+
+    async def asyncTearDown(self):
+        await Tortoise.close_connections()
+        self.dir.cleanup()
+
+    async def unique_indexes(self):
+        conn = connections.get("default")
+        return [dict(index) for index in (await conn.execute_query('PRAGMA index_list("configs")'))[1]
+                if index["unique"]]
+
+    async def test_old_table(self):
+        conn = connections.get("default")
+        await conn.execute_script('CREATE TABLE "configs" ("id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, '
+                                  '"key" VARCHAR(32) NOT NULL, "v1" VARCHAR(256) NOT NULL)')
+        await conn.execute_script("""INSERT INTO "configs" ("key", "v1") VALUES ('a', '1'), ('a', '2'), ('b', '3')""")
+        await Tortoise.generate_schemas()
+
+        await Config.migrate()
+        await Config.migrate()
+        self.assertEqual(sorted(await Config.all().values_list("key", "v1")), [("a", "2"), ("b", "3")])
+        self.assertEqual(len(await self.unique_indexes()), 1)
+        with self.assertRaises(IntegrityError):
+            await Config.create(key="a", v1="4")
+
+    async def test_new_table(self):
+        await Tortoise.generate_schemas()
+        await Config.migrate()
+        self.assertEqual(len(await self.unique_indexes()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
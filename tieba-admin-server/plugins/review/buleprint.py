@@ -1,12 +1,25 @@
-from typing import Dict
+import hmac
+import importlib.util
+from typing import Dict, List
 
 from sanic import Blueprint, Request
+from sanic.response import text
 from sanic.views import HTTPMethodView
 from sanic_jwt import protected, scoped
+from tortoise import connections
 
+from core.cache import caches
+from core.client import Client
+from core.exception import ArgException
 from core.models import Config, Permission
 from core.utils import json
-from .models import Keyword, Forum, Function
+from . import env
+from .imagehash import from_hex, phash, to_hex
+from .matcher import RULE_TYPES, validate_pattern
+from .metrics import render
+from .models import Keyword, Forum, Function, Thread, Post, ImageHash, Rule
+from .normalize import normalize
+from .status import status
 
 bp = Blueprint("review")
 
@@ -26,6 +39,106 @@ async def info(rqt: Request):
     })
 
 
+def _metrics_text():
+    return text(render(status.load().get("metrics", [])), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@bp.get("/api/review/metrics")
+@protected()
+@scoped(Permission.min(), False)
+async def metrics(rqt: Request):
+    """以Prometheus文本格式获取审查插件的指标
+
+    """
+    return _metrics_text()
+
+
+@bp.get("/api/review/metrics/scrape")
+async def scrape_metrics(rqt: Request):
+    """供Prometheus抓取的指标，使用REVIEW_METRICS_TOKEN作为Bearer令牌，而不是一小时后过期的JWT
+
+    """
+    if not env.METRICS_TOKEN:
+        return json("未设置REVIEW_METRICS_TOKEN", status_code=404)
+    authorization = rqt.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {env.METRICS_TOKEN}".encode()):
+        return json("令牌错误", status_code=401)
+    return _metrics_text()
+
+
+@bp.get("/api/review/interval")
+@protected()
+@scoped(Permission.min(), False)
+async def interval(rqt: Request):
+    """获取每个贴吧当前的轮询间隔及原因
+
+    """
+    return json(data=status.load().get("interval", {}))
+
+
+@bp.get("/api/review/dispatcher")
+@protected()
+@scoped(Permission.min(), False)
+async def dispatcher(rqt: Request):
+    """获取吧务操作队列深度、执行耗时及失败次数
+
+    """
+    return json(data=status.load().get("dispatcher", {}))
+
+
+@bp.get("/api/review/tables")
+@protected()
+@scoped(Permission.min(), False)
+async def tables(rqt: Request):
+    """获取审查记录表的行数、数据库文件大小及清理情况
+
+    """
+    data = {
+        "review_thread": await Thread.all().count(),
+        "review_post": await Post.all().count(),
+        "compaction": status.load().get("compaction", {}),
+    }
+    conn = connections.get("default")
+    if conn.capabilities.dialect == "sqlite":
+        pragma = {}
+        for name in ("page_count", "page_size", "freelist_count"):
+            _, rows = await conn.execute_query(f"PRAGMA {name}")
+            pragma[name] = rows[0][0]
+        data["db_size"] = pragma["page_count"] * pragma["page_size"]
+        data["db_free"] = pragma["freelist_count"] * pragma["page_size"]
+    return json(data=data)
+
+
+@bp.get("/api/review/media")
+@protected()
+@scoped(Permission.min(), False)
+async def media(rqt: Request):
+    """获取图片缓存的大小、命中率及下载情况
+
+    """
+    return json(data=status.load().get("media", {}))
+
+
+@bp.get("/api/review/verdicts")
+@protected()
+@scoped(Permission.min(), False)
+async def verdicts(rqt: Request):
+    """获取检查结论缓存的大小及命中率
+
+    """
+    return json(data=status.load().get("verdicts", {}))
+
+
+@bp.get("/api/review/pipeline")
+@protected()
+@scoped(Permission.min(), False)
+async def pipeline(rqt: Request):
+    """获取审查流水线各阶段的worker数、队列深度及处理耗时
+
+    """
+    return json(data=status.load().get("pipeline", {}))
+
+
 class NoExec(HTTPMethodView):
     @protected()
     @scoped(Permission.min(), False)
@@ -58,6 +171,22 @@ class NoExec(HTTPMethodView):
 bp.add_route(NoExec.as_view(), "/api/review/no_exec")
 
 
+def parse_keywords(keywords) -> List[str]:
+    """
+    检查请求中的关键词
+
+    关键词与文本一样经过规范化后再匹配，只由空白、标点、符号组成的关键词规范化后为空，永远不会命中
+
+    Raises:
+        ArgException: 不是字符串列表，或者含有规范化后为空的关键词
+    """
+    if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+        raise ArgException("关键词应为字符串列表")
+    if empty := [k for k in keywords if not normalize(k)]:
+        raise ArgException(f"关键词{'、'.join(map(repr, empty))}只含空白、标点或符号，无法匹配，请改用正则规则")
+    return keywords
+
+
 class KeywordApi(HTTPMethodView):
     @protected()
     @scoped(Permission.min(), False)
@@ -79,15 +208,189 @@ class KeywordApi(HTTPMethodView):
             keywords = await Keyword.all()
             return json(data=[k.keyword for k in keywords])
 
-        keywords = [Keyword(keyword=k) for k in keywords]
+        keywords = [Keyword(keyword=k) for k in parse_keywords(keywords)]
         await Keyword.all().delete()
         keywords = await Keyword.bulk_create(keywords)
+        await caches.bump("keyword")
         return json(data=[k.keyword for k in keywords])
 
 
 bp.add_route(KeywordApi.as_view(), "/api/review/keyword")
 
 
+RULE_ACTIONS = ("delete", "block", "hide", "black")
+# 各操作允许的天数，删除时为对发送者的封禁天数，-1是永封
+RULE_DAYS = {
+    "delete": (0, -1, 1, 3, 10),
+    "block": (1, 3, 10),
+    "hide": (1, 3, 10),
+    "black": (0,),
+}
+
+
+def _rule_body(rqt: Request) -> Dict:
+    """
+    Raises:
+        ArgException: 请求体不是对象
+    """
+    body = rqt.json or {}
+    if not isinstance(body, dict):
+        raise ArgException("请求体应为对象")
+    return body
+
+
+def _int(_rule: Dict, key: str, default: int = None) -> int:
+    """
+    Raises:
+        ArgException: 字段不是整数
+    """
+    value = _rule.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ArgException(f"{key}应为整数")
+    try:
+        return int(value)
+    except ValueError:
+        raise ArgException(f"{key}应为整数")
+
+
+def parse_rule(_rule: Dict) -> Dict:
+    """
+    检查并整理请求中的正则规则
+
+    Raises:
+        ArgException: 规则不合法
+    """
+    pattern = _rule.get("pattern")
+    if not isinstance(pattern, str):
+        raise ArgException("正则应为字符串")
+    try:
+        validate_pattern(pattern)
+    except ValueError as e:
+        raise ArgException(str(e))
+    types = _rule.get("types") or list(RULE_TYPES)
+    if not isinstance(types, list) or not set(map(str, types)) <= set(RULE_TYPES):
+        raise ArgException(f"类型只能是{'、'.join(RULE_TYPES)}")
+    min_level, max_level = _int(_rule, "min_level", 1), _int(_rule, "max_level", 18)
+    if not 0 <= min_level <= max_level <= 18:
+        raise ArgException("等级范围应在0-18之间")
+    action = _rule.get("action", "delete")
+    if not isinstance(action, str) or action not in RULE_ACTIONS:
+        raise ArgException(f"操作只能是{'、'.join(RULE_ACTIONS)}")
+    if action == "hide" and set(types) != {"thread"}:
+        raise ArgException("屏蔽只能作用于主题贴")
+    day = _int(_rule, "day", RULE_DAYS[action][0])
+    if day not in RULE_DAYS[action]:
+        raise ArgException(f"天数只能是{'、'.join(map(str, RULE_DAYS[action]))}")
+    return {
+        "pattern": pattern,
+        "types": ",".join(t for t in RULE_TYPES if t in types),
+        "min_level": min_level,
+        "max_level": max_level,
+        "action": action,
+        "day": day,
+        "enable": bool(_rule.get("enable", True)),
+        "note": str(_rule.get("note") or ""),
+    }
+
+
+class RuleApi(HTTPMethodView):
+    @protected()
+    @scoped(Permission.min(), False)
+    async def get(self, rqt: Request):
+        """获取正则规则
+
+        """
+        return json(data=[r.to_json() for r in await Rule.all()])
+
+    @protected()
+    @scoped(Permission.high(), False)
+    async def post(self, rqt: Request):
+        """添加正则规则，带有id时修改该规则
+
+        """
+        _rule = _rule_body(rqt)
+        fields = parse_rule(_rule)
+        if _rule.get("id"):
+            _id = _int(_rule, "id")
+            if not await Rule.filter(id=_id).update(**fields):
+                return json(f"规则{_id}不存在")
+            msg = f"修改规则{_id}成功"
+        else:
+            rule = await Rule.create(**fields)
+            msg = f"添加规则{rule.id}成功"
+        await caches.bump("rule")
+        return json(msg, [r.to_json() for r in await Rule.all()])
+
+    @protected()
+    @scoped(Permission.high(), False)
+    async def delete(self, rqt: Request):
+        """删除正则规则
+
+        """
+        _rule = _rule_body(rqt)
+        if not _rule.get("id"):
+            raise ArgException
+        await Rule.filter(id=_int(_rule, "id")).delete()
+        await caches.bump("rule")
+        return json(data=[r.to_json() for r in await Rule.all()])
+
+
+bp.add_route(RuleApi.as_view(), "/api/review/rule")
+
+
+class ImageHashApi(HTTPMethodView):
+    @protected()
+    @scoped(Permission.min(), False)
+    async def get(self, rqt: Request):
+        """获取图片审查的图片哈希
+
+        """
+        return json(data=[i.to_json() for i in await ImageHash.all()])
+
+    @protected()
+    @scoped(Permission.high(), False)
+    async def post(self, rqt: Request):
+        """添加图片哈希，可以直接提供16位十六进制哈希，也可以提供图片链接由服务端计算
+
+        """
+        _image: Dict = rqt.json or {}
+        if _image.get("hash"):
+            try:
+                _hash = to_hex(from_hex(_image["hash"]))
+            except ValueError:
+                raise ArgException("哈希应为16位十六进制字符串")
+        elif _image.get("url"):
+            if importlib.util.find_spec("cv2") is None or importlib.util.find_spec("numpy") is None:
+                return json("服务端未安装opencv与numpy，请直接填写图片哈希")
+            async with Client() as client:
+                image = await client.get_image(_image["url"])
+            if image.err:
+                return json(f"获取图片失败：{image.err}")
+            _hash = to_hex(phash(image.img))
+        else:
+            raise ArgException
+
+        await ImageHash.update_or_create(hash=_hash, defaults={"note": _image.get("note", "")})
+        await caches.bump("image_hash")
+        return json(f"添加图片哈希{_hash}成功", [i.to_json() for i in await ImageHash.all()])
+
+    @protected()
+    @scoped(Permission.high(), False)
+    async def delete(self, rqt: Request):
+        """删除图片哈希
+
+        """
+        _image: Dict = rqt.json or {}
+        if not _image.get("hash"):
+            raise ArgException
+        await ImageHash.filter(hash=_image["hash"].lower()).delete()
+        await caches.bump("image_hash")
+        return json(data=[i.to_json() for i in await ImageHash.all()])
+
+
+bp.add_route(ImageHashApi.as_view(), "/api/review/image")
+
+
 class ForumApi(HTTPMethodView):
     @protected()
     @scoped(Permission.min(), False)
@@ -124,24 +427,37 @@ class FunctionApi(HTTPMethodView):
     @protected()
     @scoped(Permission.min(), False)
     async def get(self, rqt: Request):
-        """获取某贴吧下某监控操作的启用情况
+        """获取某贴吧下某监控操作的启用情况及各checker的耗时、命中率
 
+        带有profile参数时返回最近一次cProfile采样的结果
         """
-        return json(data=[await f.to_json() for f in await Function.all()])
+        if rqt.args.get("profile"):
+            return json(data=status.load().get("profile"))
+        checkers = status.load().get("checkers", {})
+        functions = []
+        for f in await Function.all():
+            t = await f.to_json()
+            t["stats"] = checkers.get(f.function)
+            functions.append(t)
+        return json(data=functions)
 
     @protected()
     @scoped(Permission.high(), False)
     async def post(self, rqt: Request):
-        """设置某贴吧下某监控操作的启用
+        """设置某贴吧下某监控操作的启用，或者请求对下一轮审查进行cProfile采样
 
         """
         _func: Dict = rqt.json
         msg = None
-        if _func:
+        if _func and _func.get("profile"):
+            await Config.set_config("REVIEW_PROFILE", True)
+            msg = "将在下一轮审查时采样"
+        elif _func:
             _f = await Function.filter(function=_func["function"]).get_or_none()
             if _f:
                 _f.enable = _func["enable"]
                 await _f.save()
+                await caches.bump("function")
                 msg = f"修改{_func['function']}方法状态成功"
             else:
                 return json(f"{_func['function']}不存在")
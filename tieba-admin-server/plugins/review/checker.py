@@ -1,17 +1,29 @@
+import asyncio
+import time
+from concurrent.futures import Executor as PoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
 from functools import wraps
-from typing import Union, Callable, Coroutine, Dict, Any, Literal, List
+from typing import Union, Callable, Coroutine, Dict, Any, Literal, List, Iterable, Set, Optional
 
 from aiotieba import Client
 from aiotieba.typing import Thread, Post, Comment
+from sanic.log import logger
 
+from core.cache import VersionCache, caches
 from core.models import ForumUserPermission, Permission
-from . import execute
-from .execute import empty, delete, block
-from .models import Keyword
+from . import execute, env
+from .cpu import CheckInput, call, create_pool, set_state
+from .execute import Verdict, empty, delete, block
+from .imagehash import HashIndex, from_hex, phash
+from .matcher import KeywordMatcher, RuleMatcher, validate_pattern
+from .media import MediaTooLarge, UnsupportedMedia, decode, media
+from .models import Keyword, ImageHash, Rule
+from .models import Function as RFunction
+from .normalize import normalize, normalized_text
 
 CheckFunc = Callable[[Union[Thread, Post, Comment], Client], Coroutine[Any, Any, execute.Executor]]
-Check = Dict[Literal['function', 'kwargs'], Union[CheckFunc, Dict]]
+Check = Dict[Literal['function', 'kwargs', 'cpu_bound', 'cacheable', 'requires'], Union[CheckFunc, Dict, bool, List]]
 CheckMap = Dict[Literal['post', 'comment', 'thread'], List[Check]]
 
 
@@ -63,12 +75,113 @@ class CheckerManager:
     def __init__(self):
         self.check_map: CheckMap = {'comment': [], 'post': [], 'thread': []}
         self.check_name_map = set()
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.pool: Optional[PoolExecutor] = None
+        self._state: Dict[str, Any] = {}
 
-    def comment(self, description: str = None):
+    async def run(self, check: Check, obj: Union[Thread, Post, Comment], client: Client,
+                  _type: Literal['thread', 'post', 'comment'] = None) -> execute.Executor:
+        """
+        执行checker，并记录其耗时及返回非空操作的次数
+
+        CPU密集型checker在池中运行，只传入CheckInput，其依赖的缓存数据由sync_state在数据变化时交给池
+        Args:
+            check: check_map中的checker
+            obj: 待检查的对象
+            client: 贴吧客户端
+            _type: 对象类型
+
+        Raises:
+            asyncio.TimeoutError: CPU密集型checker超过REVIEW_CPU_TIMEOUT仍未返回，此时没有结论
+        """
+        func = check['function']
+        stat = self.stats.get(func.__name__)
+        if stat is None:
+            stat = self.stats[func.__name__] = {"calls": 0, "hits": 0, "time": 0.0, "max": 0.0, "timeouts": 0}
+        start = time.perf_counter()
+        try:
+            if check.get('cpu_bound'):
+                requires = check.get('requires', ())
+                verdict = None
+                if await self.sync_state(requires):
+                    names = tuple(cache.name for cache in requires)
+                    verdict = await self.run_in_pool(call, func, CheckInput.from_obj(_type, obj), names)
+                executor = verdict.to_executor(client, obj, func.__name__) if verdict else empty()
+            else:
+                executor = await func(obj, client)
+        except asyncio.TimeoutError:
+            stat["timeouts"] += 1
+            logger.warning(f"[review] {func.__name__} timed out on {_type} {obj.pid}")
+            raise
+        finally:
+            cost = time.perf_counter() - start
+            stat["calls"] += 1
+            stat["time"] += cost
+            stat["max"] = max(stat["max"], cost)
+        if executor and executor.need_execute:
+            stat["hits"] += 1
+        return executor
+
+    async def sync_state(self, requires: List[VersionCache]) -> bool:
+        """
+        加载CPU密集型checker依赖的缓存，数据变化时更新池中的数据，进程池会被重建
+
+        Returns:
+            数据是否都不为空，有空值（例如没有规则）时不需要执行checker
+        """
+        values = {cache.name: await cache.get() for cache in requires}
+        if any(self._state.get(name) is not value for name, value in values.items()):
+            self._state = {**self._state, **values}
+            set_state(self._state)
+            if isinstance(self.pool, ProcessPoolExecutor):
+                # 正在执行的任务在旧进程中完成
+                self.pool.shutdown(wait=False)
+                self.pool = None
+        return all(values.values())
+
+    async def run_in_pool(self, func: Callable, *args):
+        """
+        在CPU池中执行func，池在第一次使用时创建
+
+        Raises:
+            asyncio.TimeoutError: 超过REVIEW_CPU_TIMEOUT仍未返回，池中的任务不会被中止
+        """
+        if self.pool is None:
+            self.pool = create_pool(env.CPU_POOL, env.CPU_WORKERS, self._state)
+        future = asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+        return await asyncio.wait_for(future, env.CPU_TIMEOUT)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def stats_json(self) -> Dict[str, Dict[str, Any]]:
+        """
+        各checker的调用次数、命中率及耗时（单位：毫秒）
+        """
+        return {
+            name: {
+                "calls": stat["calls"],
+                "hits": stat["hits"],
+                "hit_rate": round(stat["hits"] / stat["calls"], 4),
+                "time_total": round(stat["time"] * 1000, 3),
+                "time_avg": round(stat["time"] / stat["calls"] * 1000, 3),
+                "time_max": round(stat["max"] * 1000, 3),
+                "timeouts": stat["timeouts"],
+            }
+            for name, stat in self.stats.items()
+        }
+
+    def comment(self, description: str = None, cpu_bound: bool = False, cacheable: bool = False,
+                requires: List[VersionCache] = ()):
         """
         加载处理楼中楼的checker
         Args:
             description: 已废除的参数
+            cpu_bound: 是否为CPU密集型checker，是则接收CheckInput、返回Verdict或None，在线程池或进程池中运行
+            cacheable: 结果是否只由对象类型、发送者等级及文本决定，是则相同内容的结论可以复用
+            requires: CPU密集型checker依赖的缓存，其数据依次作为参数传入，其中有空值（例如没有规则）时不执行checker
         """
 
         def wrapper(func: CheckFunc):
@@ -78,16 +191,23 @@ class CheckerManager:
                 'kwargs': {
                     'description': description,
                 },
+                'cpu_bound': cpu_bound,
+                'cacheable': cacheable,
+                'requires': requires,
             })
             return func
 
         return wrapper
 
-    def post(self, description: str = None):
+    def post(self, description: str = None, cpu_bound: bool = False, cacheable: bool = False,
+             requires: List[VersionCache] = ()):
         """
         加载处理楼层的checker
         Args:
             description: 已废除的参数
+            cpu_bound: 是否为CPU密集型checker，是则接收CheckInput、返回Verdict或None，在线程池或进程池中运行
+            cacheable: 结果是否只由对象类型、发送者等级及文本决定，是则相同内容的结论可以复用
+            requires: CPU密集型checker依赖的缓存，其数据依次作为参数传入，其中有空值（例如没有规则）时不执行checker
         """
 
         def wrapper(func: CheckFunc):
@@ -97,16 +217,23 @@ class CheckerManager:
                 'kwargs': {
                     'description': description,
                 },
+                'cpu_bound': cpu_bound,
+                'cacheable': cacheable,
+                'requires': requires,
             })
             return func
 
         return wrapper
 
-    def thread(self, description: str = None):
+    def thread(self, description: str = None, cpu_bound: bool = False, cacheable: bool = False,
+               requires: List[VersionCache] = ()):
         """
         加载处理主题贴的checker
         Args:
             description: 已废除的参数
+            cpu_bound: 是否为CPU密集型checker，是则接收CheckInput、返回Verdict或None，在线程池或进程池中运行
+            cacheable: 结果是否只由对象类型、发送者等级及文本决定，是则相同内容的结论可以复用
+            requires: CPU密集型checker依赖的缓存，其数据依次作为参数传入，其中有空值（例如没有规则）时不执行checker
         """
 
         def wrapper(func: CheckFunc):
@@ -116,6 +243,9 @@ class CheckerManager:
                 'kwargs': {
                     'description': description,
                 },
+                'cpu_bound': cpu_bound,
+                'cacheable': cacheable,
+                'requires': requires,
             })
             return func
 
@@ -123,12 +253,18 @@ class CheckerManager:
 
     def route(self,
               _type: List[Literal['thread', 'post', 'comment']],
-              description: str = None):
+              description: str = None,
+              cpu_bound: bool = False,
+              cacheable: bool = False,
+              requires: List[VersionCache] = ()):
         """
         加载处理楼中楼/楼层/主题贴的checker
         Args:
             _type: 处理类型
             description: 已废除的参数
+            cpu_bound: 是否为CPU密集型checker，是则接收CheckInput、返回Verdict或None，在线程池或进程池中运行
+            cacheable: 结果是否只由对象类型、发送者等级及文本决定，是则相同内容的结论可以复用
+            requires: CPU密集型checker依赖的缓存，其数据依次作为参数传入，其中有空值（例如没有规则）时不执行checker
         """
 
         def wrapper(func: CheckFunc):
@@ -141,30 +277,134 @@ class CheckerManager:
                     'kwargs': {
                         'description': description,
                     },
+                    'cpu_bound': cpu_bound,
+                    'cacheable': cacheable,
+                    'requires': requires,
                 })
             return func
 
         return wrapper
 
+    def enabled(self, names: Iterable[str]) -> CheckMap:
+        """
+        返回只包含已启用checker的check_map
+        Args:
+            names: 已启用的checker名
+        """
+        names = set(names)
+        return {
+            _type: [check for check in checks if check['function'].__name__ in names]
+            for _type, checks in self.check_map.items()
+        }
+
 
 manager = CheckerManager()
 
 
-@manager.route(['thread', 'post', 'comment'])
+@caches.register("function")
+async def enabled_check_map() -> CheckMap:
+    return manager.enabled(await RFunction.filter(enable=True).values_list("function", flat=True))
+
+
+@caches.register("keyword")
+async def keyword_matcher():
+    keywords = []
+    for k in await Keyword.all():
+        if keyword := normalize(k.keyword):
+            keywords.append(keyword)
+        else:
+            logger.warning(f"[review] skip keyword {k.keyword!r}: nothing left after normalization")
+    return KeywordMatcher(keywords)
+
+
+@caches.register("rule")
+async def rule_matcher() -> RuleMatcher:
+    rules = []
+    for rule in await Rule.filter(enable=True):
+        try:
+            validate_pattern(rule.pattern)
+        except ValueError as e:
+            logger.warning(f"[review] skip rule {rule.id}: {e}")
+            continue
+        rules.append(rule)
+    return RuleMatcher(rules)
+
+
+@caches.register("image_hash")
+async def image_index() -> HashIndex:
+    hashes = await ImageHash.all().values_list("hash", flat=True)
+    return HashIndex((from_hex(h) for h in hashes), env.IMAGE_HASH_DISTANCE)
+
+
+@caches.register("black", version="permission")
+async def black_list() -> Set[int]:
+    return set(await ForumUserPermission.filter(permission=Permission.Black.value).values_list("user_id", flat=True))
+
+
+@manager.route(['thread', 'post', 'comment'], cacheable=True)
 @ignore_office()
 async def check_keyword(t: Union[Thread, Post, Comment], client: Client):
     if t.user.level in Level.LOW.value:
-        keywords = await Keyword.all()
-        for kw in keywords:
-            if t.text.find(kw.keyword) != -1:
-                return delete(client, t, func_name="check_keyword")
+        matcher: KeywordMatcher = await keyword_matcher.get()
+        if keywords := matcher.findall(normalized_text(t)):
+            logger.debug(f"[review] check_keyword hit {keywords}")
+            return delete(client, t, func_name="check_keyword")
+    return empty()
+
+
+def image_phash(data: bytes) -> int:
+    return phash(decode(data))
+
+
+@manager.route(['thread', 'post', 'comment'], cpu_bound=True, cacheable=True, requires=[rule_matcher])
+def check_rule(data: CheckInput, matcher: RuleMatcher) -> Optional[Verdict]:
+    """
+    在池中执行，使用进程池时与事件循环并行。re匹配时持有GIL，线程池并不能避免卡住事件循环，
+    因此回溯严重的正则在validate_pattern中被拒绝
+    """
+    if data.user_id in OFFICES_ID:
+        return None
+    if matcher and (rule := matcher.search(data.type, data.level, data.text)):
+        logger.debug(f"[review] check_rule hit rule {rule.id}")
+        return Verdict(rule.action, rule.day)
+    return None
+
+
+# 下载或解码失败时放行，结论不可复用，因此不是cacheable
+@manager.route(['thread', 'post'])
+@ignore_office()
+async def check_image(t: Union[Thread, Post], client: Client):
+    index: HashIndex = await image_index.get()
+    if not len(index):
+        return empty()
+    for img in getattr(t.contents, "imgs", ()):
+        if (data := await media.get(img.src, img.hash)) is None:
+            continue
+        try:
+            value = await manager.run_in_pool(image_phash, data)
+        except ImportError as e:
+            logger.warning(f"[review] check_image requires opencv and numpy: {e!r}")
+            return empty()
+        except UnsupportedMedia as e:
+            media.unsupported += 1
+            logger.debug(f"[review] check_image skipped {img.src}: {e}")
+            continue
+        except MediaTooLarge as e:
+            media.too_large += 1
+            logger.debug(f"[review] check_image skipped {img.src}: {e}")
+            continue
+        except Exception as e:
+            logger.debug(f"[review] check_image failed to decode {img.src}: {e!r}")
+            continue
+        if match := index.search(value):
+            logger.debug(f"[review] check_image hit {match[0]:016x}, distance {match[1]}")
+            return delete(client, t, func_name="check_image")
     return empty()
 
 
 @manager.route(['thread', 'post', 'comment'])
 async def check_black(t: Union[Thread, Post, Comment], client: Client):
-    user = await ForumUserPermission.filter(user_id=t.user.user_id, permission=Permission.Black.value).get_or_none()
-    if user:
+    if t.user.user_id in await black_list.get():
         return block(client, t, 10, func_name="check_black")
     return empty()
 
@@ -175,13 +415,13 @@ def _level_wall(level: int, thread: Thread, client: Client):
     return empty()
 
 
-@manager.thread()
+@manager.thread(cacheable=True)
 @ignore_office()
 async def level_wall_1(thread: Thread, client: Client):
     return _level_wall(1, thread, client)
 
 
-@manager.thread()
+@manager.thread(cacheable=True)
 @ignore_office()
 async def level_wall_3(thread: Thread, client: Client):
     return _level_wall(3, thread, client)
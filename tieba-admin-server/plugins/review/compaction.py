@@ -0,0 +1,93 @@
+import asyncio
+import time
+from typing import Callable, Optional, Set
+
+from sanic.log import logger
+from tortoise.transactions import in_transaction
+
+from .models import Post as RPost
+from .models import Thread as RThread
+
+
+class Compactor(object):
+    """
+    清理长期不活跃的主题贴记录
+
+    最后回复时间早于days天前的主题贴连同其楼层、楼中楼记录一起删除，每批只处理batch_size个主题贴，
+    批次之间让出事件循环，避免长时间占用数据库影响审查。
+    被清理的主题贴之后有新回复时会被当作新主题贴重新检查。
+    置顶帖等长期没有回复却仍在首页的主题贴每轮都会被获取，清理后会被反复当作新主题贴，因此不清理首页上的主题贴
+
+    Attributes:
+        days: 保留天数，为0时不清理
+        batch_size: 每批删除的主题贴数
+        interval: 两次清理的间隔（单位：秒）
+        protected: 返回不能清理的tid，即各贴吧当前首页上的主题贴
+    """
+    PAUSE = 0.5
+
+    def __init__(self, days: int, batch_size: int, interval: float, protected: Callable[[], Set[int]] = set):
+        self.days = days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.protected = protected
+
+        self.threads_deleted = 0
+        self.posts_deleted = 0
+        self.last_run: Optional[float] = None
+        self.last_cost = 0.0
+
+    async def compact_batch(self, cutoff: int) -> int:
+        """
+        删除一批过期的主题贴及其楼层
+        Args:
+            cutoff: 最后回复时间早于该时间戳的主题贴会被删除
+
+        Returns:
+            int: 本批删除的主题贴数
+        """
+        query = RThread.filter(last_time__lt=cutoff)
+        if protected := self.protected():
+            query = query.exclude(tid__in=list(protected))
+        tids = await query.limit(self.batch_size).values_list("tid", flat=True)
+        if not tids:
+            return 0
+        async with in_transaction() as conn:
+            self.posts_deleted += await RPost.filter(tid__in=tids).using_db(conn).delete()
+            await RThread.filter(tid__in=tids).using_db(conn).delete()
+        self.threads_deleted += len(tids)
+        return len(tids)
+
+    async def compact(self):
+        """
+        分批清理所有过期记录
+        """
+        start = time.perf_counter()
+        cutoff = int(time.time()) - self.days * 24 * 60 * 60
+        deleted = 0
+        while count := await self.compact_batch(cutoff):
+            deleted += count
+            await asyncio.sleep(self.PAUSE)
+        self.last_run = time.time()
+        self.last_cost = time.perf_counter() - start
+        if deleted:
+            logger.info(f"[review] compaction removed {deleted} threads in {self.last_cost:.1f}s")
+
+    async def run(self):
+        if self.days <= 0:
+            return
+        while True:
+            try:
+                await self.compact()
+            except Exception as e:
+                logger.warning(f"[review] compaction failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            "retention_days": self.days,
+            "threads_deleted": self.threads_deleted,
+            "posts_deleted": self.posts_deleted,
+            "last_run": int(self.last_run) if self.last_run else None,
+            "last_cost": round(self.last_cost, 3),
+        }
@@ -0,0 +1,79 @@
+import multiprocessing
+from concurrent.futures import Executor as PoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Literal, Optional, Tuple, Union
+
+from aiotieba.typing import Thread, Post, Comment
+from sanic.log import logger
+
+from .normalize import normalized_text
+
+
+@dataclass(frozen=True)
+class CheckInput(object):
+    """
+    CPU密集型checker的输入，只包含可以pickle的基本类型，进程间传递开销小
+
+    Attributes:
+        type: thread、post或comment
+        fid: 所在吧id
+        tid: 所在主题贴id
+        pid: 回复id，主题贴为首楼pid
+        user_id: 发送者user_id
+        level: 发送者等级
+        text: 文本内容
+        normalized: 规范化后的文本，见normalize.normalize
+        imgs: 图片链接
+    """
+    type: Literal["thread", "post", "comment"]
+    fid: int
+    tid: int
+    pid: int
+    user_id: int
+    level: int
+    text: str
+    normalized: str = ""
+    imgs: Tuple[str, ...] = ()
+
+    @staticmethod
+    def from_obj(_type: str, obj: Union[Thread, Post, Comment]) -> "CheckInput":
+        imgs = tuple(img.src for img in getattr(obj.contents, "imgs", ()))
+        return CheckInput(_type, obj.fid, obj.tid, obj.pid, obj.user.user_id, obj.user.level, obj.text,
+                          normalized_text(obj), imgs)
+
+
+# CPU密集型checker依赖的缓存数据，缓存名 -> 数据。线程池与事件循环共用本进程的值，
+# 进程池的每个进程在启动时由set_state设置，数据变化时重建进程池，而不是每次调用都传递一遍
+_state: Dict[str, Any] = {}
+
+
+def set_state(state: Dict[str, Any]):
+    global _state
+    _state = dict(state)
+
+
+def call(func: Callable, data: CheckInput, names: Tuple[str, ...]):
+    """
+    在池中执行CPU密集型checker，依次传入其依赖的缓存数据
+    """
+    return func(data, *[_state[name] for name in names])
+
+
+def create_pool(kind: Literal["thread", "process"], workers: int,
+                state: Optional[Dict[str, Any]] = None) -> PoolExecutor:
+    """
+    创建运行CPU密集型checker的池
+
+    插件进程由Sanic以守护进程启动，守护进程不能创建子进程，此时进程池退化为线程池
+    Args:
+        kind: thread或process
+        workers: 线程数或进程数
+        state: 进程池中每个进程启动时设置的缓存数据
+    """
+    if kind == "process":
+        if not multiprocessing.current_process().daemon:
+            return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=set_state, initargs=(state or {},))
+        logger.warning("[review] daemonic plugin process cannot start a process pool, use threads instead")
+    return ThreadPoolExecutor(workers, thread_name_prefix="review-cpu")
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from sanic.log import logger
+
+from core.models import ExecuteLog
+from .execute import Executor
+from .metrics import metrics
+
+
+class Dispatcher(object):
+    """
+    吧务操作分发器
+
+    检查协程只把需要执行的Executor放入有界队列，由若干worker执行删贴、封禁等远程操作，
+    队列满时放入方等待，操作记录积累到一定数量或者定时批量写入数据库
+
+    Attributes:
+        workers: worker数量
+        flush_size: 操作记录积累到该数量时立即写入
+        flush_interval: 操作记录定时写入的间隔（单位：秒）
+    """
+
+    def __init__(self, workers: int, maxsize: int, flush_size: int, flush_interval: float):
+        self.workers = workers
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.maxsize = maxsize
+        self.logs: List[ExecuteLog] = []
+        self._tasks: List[asyncio.Task] = []
+        self._flush_lock = asyncio.Lock()
+
+        self.executed = 0
+        self.failed = 0
+        self.logged = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flusher()))
+
+    async def stop(self):
+        """
+        等待队列中的操作执行完毕，写入剩余的操作记录
+
+        flush持有锁，最后一次flush会等待worker中正在进行的写入完成
+        """
+        if self.queue is not None:
+            await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.flush()
+
+    async def put(self, executor: Executor):
+        await self.queue.put(executor)
+
+    async def _worker(self):
+        while True:
+            executor: Executor = await self.queue.get()
+            start = time.perf_counter()
+            try:
+                logs, errors = await executor.execute()
+                self.logs.extend(logs)
+                self.failed += len(errors)
+            except Exception as e:
+                logger.warning(f"[review] execute failed: {e!r}")
+                self.failed += 1
+            finally:
+                latency = time.perf_counter() - start
+                metrics.stage.observe(latency, stage="execute")
+                self.executed += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+                self.queue.task_done()
+            if len(self.logs) >= self.flush_size:
+                # stop取消worker时，正在进行的写入需要完成，否则取出的这批记录会丢失
+                await asyncio.shield(self.flush())
+
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.shield(self.flush())
+
+    async def flush(self):
+        """
+        批量写入积累的操作记录
+        """
+        async with self._flush_lock:
+            if not self.logs:
+                return
+            logs, self.logs = self.logs, []
+            try:
+                await ExecuteLog.bulk_create(logs)
+                self.logged += len(logs)
+            except Exception as e:
+                logger.warning(f"[review] write execute log failed: {e!r}")
+                self.logs = logs + self.logs
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.maxsize,
+            "executed": self.executed,
+            "failed": self.failed,
+            "logged": self.logged,
+            "pending_logs": len(self.logs),
+            "latency_avg": round(self.latency_total / self.executed, 3) if self.executed else 0,
+            "latency_max": round(self.latency_max, 3),
+        }
@@ -0,0 +1,35 @@
+from core.env import env
+
+CONCURRENCY = env.int("REVIEW_CONCURRENCY", 8)
+FORUM_CONCURRENCY = env.int("REVIEW_FORUM_CONCURRENCY", 4)
+SCHEDULE_INTERVAL = env.float("REVIEW_SCHEDULE_INTERVAL", 30.0)
+MIN_INTERVAL = env.float("REVIEW_MIN_INTERVAL", 10.0)
+MAX_INTERVAL = env.float("REVIEW_MAX_INTERVAL", 120.0)
+EXEC_WORKERS = env.int("REVIEW_EXEC_WORKERS", 2)
+EXEC_QUEUE_SIZE = env.int("REVIEW_EXEC_QUEUE_SIZE", 256)
+LOG_FLUSH_SIZE = env.int("REVIEW_LOG_FLUSH_SIZE", 50)
+LOG_FLUSH_INTERVAL = env.float("REVIEW_LOG_FLUSH_INTERVAL", 5.0)
+SEEN_RECENT_SIZE = env.int("REVIEW_SEEN_RECENT_SIZE", 100000)
+SEEN_BLOOM_CAPACITY = env.int("REVIEW_SEEN_BLOOM_CAPACITY", 1000000)
+SEEN_BLOOM_ERROR_RATE = env.float("REVIEW_SEEN_BLOOM_ERROR_RATE", 0.01)
+SEEN_SNAPSHOT_INTERVAL = env.float("REVIEW_SEEN_SNAPSHOT_INTERVAL", 300.0)
+RETENTION_DAYS = env.int("REVIEW_RETENTION_DAYS", 0)
+COMPACT_BATCH_SIZE = env.int("REVIEW_COMPACT_BATCH_SIZE", 200)
+COMPACT_INTERVAL = env.float("REVIEW_COMPACT_INTERVAL", 3600.0)
+PROFILE_LINES = env.int("REVIEW_PROFILE_LINES", 40)
+POST_WORKERS = env.int("REVIEW_POST_WORKERS", 4)
+COMMENT_WORKERS = env.int("REVIEW_COMMENT_WORKERS", 4)
+CHECK_WORKERS = env.int("REVIEW_CHECK_WORKERS", 8)
+STAGE_QUEUE_SIZE = env.int("REVIEW_STAGE_QUEUE_SIZE", 64)
+CPU_POOL = env.str("REVIEW_CPU_POOL", "thread")
+CPU_WORKERS = env.int("REVIEW_CPU_WORKERS", 2)
+CPU_TIMEOUT = env.float("REVIEW_CPU_TIMEOUT", 5.0)
+IMAGE_HASH_DISTANCE = env.int("REVIEW_IMAGE_HASH_DISTANCE", 6)
+MEDIA_CACHE_SIZE = env.int("REVIEW_MEDIA_CACHE_SIZE", 256 * 1024 * 1024)
+MEDIA_MAX_FILE_SIZE = env.int("REVIEW_MEDIA_MAX_FILE_SIZE", 10 * 1024 * 1024)
+MEDIA_MAX_PIXELS = env.int("REVIEW_MEDIA_MAX_PIXELS", 25_000_000)
+MEDIA_CONCURRENCY = env.int("REVIEW_MEDIA_CONCURRENCY", 4)
+MEDIA_TIMEOUT = env.float("REVIEW_MEDIA_TIMEOUT", 10.0)
+VERDICT_CACHE_SIZE = env.int("REVIEW_VERDICT_CACHE_SIZE", 10000)
+METRICS_INTERVAL = env.float("REVIEW_METRICS_INTERVAL", 5.0)
+METRICS_TOKEN = env.str("REVIEW_METRICS_TOKEN", "")
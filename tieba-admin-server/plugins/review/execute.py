@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Union, Literal
+from typing import Union, Literal, List, Tuple
 
 from aiotieba import Client
 from aiotieba.typing import Comment as Tb_Comment
@@ -37,17 +37,27 @@ class Executor(object):
 
     async def run(self):
         """
-        执行操作
+        执行操作并写入操作记录
         Returns:
             None
 
         """
+        logs, _ = await self.execute()
+        if logs:
+            await ExecuteLog.bulk_create(logs)
 
-        note = ""
-        for i in self.note:
-            note += f",{i}"
-        note = note[1:]
+    async def execute(self) -> Tuple[List[ExecuteLog], List[Exception]]:
+        """
+        执行操作，不写入数据库
+        Returns:
+            Tuple[List[ExecuteLog], List[Exception]]: 未保存的操作记录, 执行失败的错误
+
+        """
 
+        note = ",".join(self.note)
+
+        logs: List[ExecuteLog] = []
+        errors: List[Exception] = []
         user: UserInfo = await self.client.get_self_info()
         rst = True
         match self.user_opt:
@@ -55,51 +65,61 @@ class Executor(object):
                 pass
             case ExecuteType.Block:
                 rst = await self.client.block(self.obj.fid, self.obj.user.portrait, day=self.user_day)
-                await ExecuteLog.create(user=f"[{BOT_PRE}] {user.user_name}",
-                                        type=ExecuteType.Block,
-                                        obj=self.obj.user.user_name,
-                                        note=f"[{note}] {self.user_day}")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}] {user.user_name}",
+                                       type=ExecuteType.Block,
+                                       obj=self.obj.user.user_name,
+                                       note=f"[{note}] {self.user_day}"))
             case ExecuteType.Black:
                 rst = await self.client.add_bawu_blacklist(self.obj.fname, self.obj.user.portrait)
-                await ExecuteLog.create(user=f"[{BOT_PRE}] {user.user_name}",
-                                        type=ExecuteType.Black,
-                                        obj=self.obj.user.user_name,
-                                        note=f"[{note}]")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}] {user.user_name}",
+                                       type=ExecuteType.Black,
+                                       obj=self.obj.user.user_name,
+                                       note=f"[{note}]"))
         if not rst:
             logger.warning(rst.err)
+            errors.append(rst.err)
         rst = True
         match self.option:
             case ExecuteType.Empty:
                 pass
             case ExecuteType.ThreadHide:
                 rst = await self.client.hide_thread(self.obj.fid, self.obj.tid)
-                await ExecuteLog.create(user=f"[{BOT_PRE}] {user.user_name}",
-                                        type=ExecuteType.Hide,
-                                        obj=str(self.obj.tid),
-                                        note=f"[{note}] {self.obj.text}")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}] {user.user_name}",
+                                       type=ExecuteType.ThreadHide,
+                                       obj=str(self.obj.tid),
+                                       note=f"[{note}] {self.obj.text}"))
 
             case ExecuteType.ThreadDelete:
                 rst = await self.client.del_thread(self.obj.fid, self.obj.tid)
-                await ExecuteLog.create(user=f"[{BOT_PRE}]{user.user_name}",
-                                        type=ExecuteType.ThreadDelete,
-                                        obj=str(self.obj.tid),
-                                        note=f"[{note}] {self.obj.text}")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}]{user.user_name}",
+                                       type=ExecuteType.ThreadDelete,
+                                       obj=str(self.obj.tid),
+                                       note=f"[{note}] {self.obj.text}"))
 
             case ExecuteType.PostDelete:
                 rst = await self.client.del_post(self.obj.fid, self.obj.tid, self.obj.pid)
-                await ExecuteLog.create(user=f"[{BOT_PRE}]{user.user_name}",
-                                        type=ExecuteType.PostDelete,
-                                        obj=str(self.obj.pid),
-                                        note=f"[{note}] {self.obj.text}")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}]{user.user_name}",
+                                       type=ExecuteType.PostDelete,
+                                       obj=str(self.obj.pid),
+                                       note=f"[{note}] {self.obj.text}"))
 
             case ExecuteType.CommentDelete:
                 rst = await self.client.del_post(self.obj.fid, self.obj.tid, self.obj.pid)
-                await ExecuteLog.create(user=f"[{BOT_PRE}]{user.user_name}",
-                                        type=ExecuteType.CommentDelete,
-                                        obj=str(self.obj.pid),
-                                        note=f"[{note}] {self.obj.text}")
+                logs.append(ExecuteLog(user=f"[{BOT_PRE}]{user.user_name}",
+                                       type=ExecuteType.CommentDelete,
+                                       obj=str(self.obj.pid),
+                                       note=f"[{note}] {self.obj.text}"))
         if not rst:
             logger.warning(rst.err)
+            errors.append(rst.err)
+        return logs, errors
+
+    @property
+    def need_execute(self) -> bool:
+        """
+        是否包含需要执行的操作
+        """
+        return self.user_opt != ExecuteType.Empty or self.option != ExecuteType.Empty
 
     def exec_compare(self, exec2):
         """
@@ -261,3 +281,33 @@ def black(client: Client, obj: Union[Tb_Thread, Tb_Post, Tb_Comment], func_name:
         user_opt=ExecuteType.Black,
         note={func_name},
     )
+
+
+@dataclass(frozen=True)
+class Verdict(object):
+    """
+    可以在进程间传递的检查结果
+
+    CPU密集型checker在线程池或进程池中运行，无法持有客户端与aiotieba对象，返回Verdict后再由事件循环转换为Executor
+
+    Attributes:
+        action: delete、block、hide或black，与同名的操作函数对应
+        day: 操作持续时间（单位：天）
+    """
+    action: Literal["delete", "block", "hide", "black"]
+    day: int = 0
+
+    def to_executor(self, client: Client, obj: Union[Tb_Thread, Tb_Post, Tb_Comment], func_name: str = ""):
+        match self.action:
+            case "delete":
+                return delete(client, obj, self.day, func_name=func_name)
+            case "block":
+                return block(client, obj, self.day or 1, func_name=func_name)
+            case "hide" if isinstance(obj, Tb_Thread):
+                return hide(client, obj, self.day or 1, func_name=func_name)
+            case "hide":
+                # 楼与楼中楼无法单独屏蔽，屏蔽会作用于整个主题贴，改为删除
+                return delete(client, obj, func_name=func_name)
+            case "black":
+                return black(client, obj, func_name=func_name)
+        return empty()
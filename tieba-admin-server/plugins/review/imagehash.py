@@ -0,0 +1,114 @@
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_BITS = 64
+
+
+def phash(img) -> int:
+    """
+    计算图片的64位感知哈希
+
+    缩放到32x32灰度图后做DCT，取左上角8x8低频系数与其中位数比较，对缩放、压缩、轻微涂改不敏感。
+    依赖opencv与numpy，和aiotieba.Client.get_image一样在调用时才导入
+    Args:
+        img: aiotieba.Client.get_image返回的BGR或灰度图像
+
+    Returns:
+        64位整数形式的哈希
+    """
+    import cv2 as cv
+    import numpy as np
+
+    if img.ndim == 3:
+        img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+    small = cv.resize(img, (32, 32), interpolation=cv.INTER_AREA).astype(np.float32)
+    low = cv.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: str) -> int:
+    """
+    Raises:
+        ValueError: 不是16位十六进制字符串
+    """
+    if len(value) != HASH_BITS // 4:
+        raise ValueError(value)
+    return int(value, 16)
+
+
+class HashIndex(object):
+    """
+    按汉明距离查找相似哈希的多索引哈希表
+
+    哈希被切成chunks段，每段各建一张表。两个哈希的距离不超过max_distance时，
+    至少有一段的距离不超过max_distance // chunks，因此只需在每张表中查找该段翻转少量位后的值，
+    再对候选逐个计算距离，查询耗时与哈希总数基本无关
+
+    Attributes:
+        max_distance: 视为相似的最大汉明距离
+        chunks: 分段数
+    """
+
+    def __init__(self, hashes: Iterable[int] = (), max_distance: int = 6, chunks: int = 4):
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self._width = HASH_BITS // chunks
+        self._mask = (1 << self._width) - 1
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(chunks)]
+        self._hashes = set()
+
+        radius = max_distance // chunks
+        self._flips = [0]
+        for r in range(1, radius + 1):
+            for bits in combinations(range(self._width), r):
+                self._flips.append(sum(1 << b for b in bits))
+
+        for h in hashes:
+            self.add(h)
+
+    def _parts(self, value: int):
+        for i in range(self.chunks):
+            yield i, (value >> (i * self._width)) & self._mask
+
+    def add(self, value: int):
+        if value in self._hashes:
+            return
+        self._hashes.add(value)
+        for i, part in self._parts(value):
+            self._tables[i].setdefault(part, []).append(value)
+
+    def search(self, value: int) -> Optional[Tuple[int, int]]:
+        """
+        查找与value最相近的哈希
+        Args:
+            value: 待查询的哈希
+
+        Returns:
+            (哈希, 距离)，没有距离在max_distance以内的哈希时为None
+        """
+        if value in self._hashes:
+            return value, 0
+        best = None
+        checked = set()
+        for i, part in self._parts(value):
+            table = self._tables[i]
+            for flip in self._flips:
+                for candidate in table.get(part ^ flip, ()):
+                    if candidate in checked:
+                        continue
+                    checked.add(candidate)
+                    distance = (candidate ^ value).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = candidate, distance
+        return best
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, value: int):
+        return value in self._hashes
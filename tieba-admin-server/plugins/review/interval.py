@@ -0,0 +1,87 @@
+import random
+import time
+from typing import Iterable, Optional
+
+
+class PollInterval(object):
+    """
+    根据贴吧活跃度自适应的轮询间隔
+
+    活跃度取以下两者的较大值：
+    上一轮发现的新内容数除以间隔时长；首页主题贴中最近WINDOW秒内有回复的贴子数除以WINDOW。
+    间隔取使下一轮预计发现TARGET条新内容的时长，限制在[floor, ceiling]内。
+    缩短立即生效以尽快处理爆发的内容，延长每轮最多为原来的GROWTH倍
+
+    Attributes:
+        floor: 最短间隔（单位：秒）
+        ceiling: 最长间隔（单位：秒）
+        interval: 当前间隔（单位：秒）
+        reason: 选择当前间隔的原因
+    """
+    TARGET = 5
+    WINDOW = 600
+    GROWTH = 1.5
+    JITTER = 0.1
+
+    def __init__(self, floor: float, ceiling: float):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.interval = ceiling
+        self.reason = "init"
+        self.rate = 0.0
+        self._last_update: Optional[float] = None
+
+    def update(self, new_objects: int, last_times: Iterable[int] = (), now: float = None) -> float:
+        """
+        根据本轮结果计算下一轮的间隔
+        Args:
+            new_objects: 本轮发现的新主题贴、楼层、楼中楼总数
+            last_times: 本轮首页主题贴的最后回复时间（时间戳，单位：秒）
+            now: 当前时间戳，默认为当前时间
+
+        Returns:
+            float
+        """
+        if now is None:
+            now = time.time()
+        elapsed = now - self._last_update if self._last_update else self.interval
+        self._last_update = now
+
+        object_rate = new_objects / max(elapsed, 1.0)
+        recent = sum(1 for t in last_times if 0 <= now - t <= self.WINDOW)
+        reply_rate = recent / self.WINDOW
+        self.rate = max(object_rate, reply_rate)
+
+        if self.rate <= 0:
+            target = self.ceiling
+            self.reason = f"idle: no activity in {self.WINDOW}s"
+        else:
+            target = self.TARGET / self.rate
+            if object_rate >= reply_rate:
+                self.reason = f"{new_objects} new objects in {elapsed:.0f}s"
+            else:
+                self.reason = f"{recent} threads replied in {self.WINDOW}s"
+
+        if target > self.interval:
+            target = min(target, self.interval * self.GROWTH)
+        self.interval = min(max(target, self.floor), self.ceiling)
+        if self.interval == self.floor:
+            self.reason += ", floor"
+        elif self.interval == self.ceiling:
+            self.reason += ", ceiling"
+        return self.interval
+
+    def sleep_time(self) -> float:
+        """
+        加入随机抖动后的实际等待时间
+        """
+        return self.interval * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def to_json(self):
+        return {
+            "interval": round(self.interval, 1),
+            "reason": self.reason,
+            "rate": round(self.rate * 60, 2),
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+        }
@@ -0,0 +1,282 @@
+import re
+from collections import deque
+from typing import Iterable, Dict, List, Tuple, Set, Any, Optional, Pattern, FrozenSet
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+
+class KeywordMatcher(object):
+    """
+    基于Aho-Corasick自动机的多关键词匹配器
+
+    构建后只需扫描一遍文本即可找出所有命中的关键词，耗时与关键词数量无关。
+    关键词较少时逐个用 ``in`` 查找反而更快，此时不使用自动机
+
+    Attributes:
+        keywords: 构建自动机所用的关键词
+        SMALL: 关键词数量少于该值时不使用自动机
+    """
+    __slots__ = ("keywords", "_goto", "_fail", "_output")
+    SMALL = 64
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        self.keywords = frozenset(k for k in keywords if k)
+
+        goto: List[Dict[str, int]] = [{}]
+        output: List[Tuple[str, ...]] = [()]
+        for keyword in self.keywords:
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    output.append(())
+                state = next_state
+            output[state] += (keyword,)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[next_state] = goto[f].get(char, 0)
+                output[next_state] += output[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._output = output
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def findall(self, text: str) -> Set[str]:
+        """
+        扫描一遍文本，返回所有命中的关键词
+
+        Args:
+            text: 待匹配文本
+
+        Returns:
+            Set[str]
+        """
+        found = set()
+        if not self.keywords or not text:
+            return found
+        if len(self.keywords) < self.SMALL:
+            return {k for k in self.keywords if k in text}
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def search(self, text: str) -> bool:
+        """
+        文本中是否含有任一关键词，命中即返回
+
+        Args:
+            text: 待匹配文本
+
+        Returns:
+            bool
+        """
+        if not self.keywords or not text:
+            return False
+        if len(self.keywords) < self.SMALL:
+            return any(k in text for k in self.keywords)
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+
+RULE_TYPES = ("thread", "post", "comment")
+RULE_LEVELS = range(0, 19)
+_GROUP_EXP = re.compile(r"\\[1-9]|\(\?P[<=]")
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, "POSSESSIVE_REPEAT", None)}
+
+
+def _catastrophic(items, repeated: bool = False) -> bool:
+    """
+    是否含有会导致回溯次数指数增长的结构：重复内再嵌套重复，如(a+)+、(\\w+\\s?)*，
+    或者不限次数的重复内含有分支，如(a|ab)*
+    Args:
+        items: sre_parse解析出的子模式
+        repeated: 是否处于可以重复多次的重复内
+    """
+    for op, av in items:
+        if op in _REPEATS:
+            many = av[1] > 1
+            if many and repeated:
+                return True
+            if _catastrophic(av[2], repeated or many):
+                return True
+            if av[1] == sre_parse.MAXREPEAT and any(sub_op is sre_parse.BRANCH for sub_op, _ in _flatten(av[2])):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _catastrophic(av[3], repeated):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_catastrophic(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            if _catastrophic(av[1], repeated):
+                return True
+    return False
+
+
+def _flatten(items):
+    """
+    展开分组，得到不在重复内的各个子模式
+    """
+    for op, av in items:
+        if op is sre_parse.SUBPATTERN:
+            yield from _flatten(av[3])
+        else:
+            yield op, av
+
+
+def validate_pattern(pattern: str):
+    """
+    检查正则规则能否加入RuleMatcher
+
+    re是持有GIL的回溯引擎，即使在线程池中执行，回溯严重的正则也会卡住事件循环，因此拒绝这类写法
+    Raises:
+        ValueError: 无法编译，使用了命名分组、分组引用，或者可能回溯严重
+    """
+    if not pattern:
+        raise ValueError("正则不能为空")
+    if _GROUP_EXP.search(pattern):
+        raise ValueError("正则中不能使用命名分组或分组引用")
+    try:
+        parsed = sre_parse.parse(pattern)
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"正则无法编译：{e}")
+    if _catastrophic(parsed):
+        raise ValueError("正则中不能在重复内嵌套重复，或在不限次数的重复内使用|分支，请改用字符集等写法")
+
+
+def required_literal(pattern: str) -> str:
+    """
+    找出正则任一匹配中都一定出现的最长字面量
+
+    只考虑不在分支、可选重复中的连续字面字符，忽略大小写时返回空字符串
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return ""
+    if parsed.state.flags & re.IGNORECASE:
+        return ""
+
+    best = ""
+
+    def walk(items):
+        nonlocal best
+        run = ""
+        for op, av in items:
+            if op is sre_parse.LITERAL:
+                run += chr(av)
+                continue
+            best = max(best, run, key=len)
+            run = ""
+            if op is sre_parse.SUBPATTERN and not av[1] & re.IGNORECASE:
+                walk(av[3])
+            elif op in _REPEATS and av[0] >= 1:
+                walk(av[2])
+        best = max(best, run, key=len)
+
+    walk(parsed)
+    return best
+
+
+class RuleMatcher(object):
+    """
+    合并所有正则规则的匹配器
+
+    Python的re是回溯引擎，把规则用|拼成一个正则并不能减少扫描次数。
+    因此加载时取出每条规则一定出现的字面量，构建一个Aho-Corasick自动机，每段文本只扫描一遍自动机，
+    只有命中了字面量的规则（以及取不出字面量的规则）才执行各自预编译的正则。
+    规则的适用等级与类型在加载时展开为每个（类型, 等级）适用的规则集合。
+    规则较少时逐条执行正则反而更快，此时不使用自动机
+
+    Attributes:
+        rules: id -> 规则，规则需要有id、pattern、types、min_level、max_level属性，types为逗号分隔的类型
+        SMALL: 规则数量少于该值时不使用自动机
+    """
+    SMALL = 200
+
+    def __init__(self, rules: Iterable[Any] = ()):
+        self.rules: Dict[int, Any] = {r.id: r for r in rules}
+        self._patterns: Dict[int, Pattern] = {i: re.compile(r.pattern) for i, r in self.rules.items()}
+
+        self._by_literal: Dict[str, List[int]] = {}
+        self._always: List[int] = []
+        for i, r in self.rules.items():
+            if literal := required_literal(r.pattern):
+                self._by_literal.setdefault(literal, []).append(i)
+            else:
+                self._always.append(i)
+        self._literals = KeywordMatcher(self._by_literal) if len(self.rules) >= self.SMALL else None
+
+        scopes: Dict[FrozenSet[int], FrozenSet[int]] = {}
+        self._scopes: Dict[Tuple[str, int], FrozenSet[int]] = {}
+        for _type in RULE_TYPES:
+            for level in RULE_LEVELS:
+                ids = frozenset(i for i, r in self.rules.items()
+                                if r.min_level <= level <= r.max_level and _type in r.types.split(","))
+                self._scopes[(_type, level)] = scopes.setdefault(ids, ids)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def search(self, _type: str, level: int, text: str) -> Optional[Any]:
+        """
+        返回id最小的命中规则
+
+        Args:
+            _type: thread、post或comment
+            level: 发送者等级
+            text: 待匹配文本
+
+        Returns:
+            命中的规则，没有命中时为None
+        """
+        scope = self._scopes.get((_type, min(max(level, 0), 18)))
+        if not scope or not text:
+            return None
+        if self._literals is None:
+            candidates = scope
+        else:
+            candidates = [i for i in self._always if i in scope]
+            for literal in self._literals.findall(text):
+                candidates.extend(i for i in self._by_literal[literal] if i in scope)
+        for i in sorted(candidates):
+            if self._patterns[i].search(text):
+                return self.rules[i]
+        return None
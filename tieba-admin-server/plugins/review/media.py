@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import os
+import re
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiotieba.exception import HTTPStatusError
+from sanic.log import logger
+
+from core.env import CACHE_PATH
+from . import env
+
+MEDIA_PATH = f"{CACHE_PATH}/review_media"
+
+_KEY_EXP = re.compile(r"[0-9A-Za-z]{8,64}")
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+class UnsupportedMedia(Exception):
+    pass
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """
+    只读取文件头获取图片宽高，支持jpeg、png、gif、bmp、webp
+    Returns:
+        (宽, 高)，无法识别时为None
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a") and len(data) >= 10:
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return width, abs(height)
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP" and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b"VP8 ":
+            # 有损格式，关键帧起始码之后是14位的宽高
+            if data[23:26] != b"\x9d\x01\x2a":
+                return None
+            width, height = struct.unpack("<HH", data[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            # 无损格式，签名0x2f之后是14位的宽-1、高-1
+            if data[20] != 0x2F:
+                return None
+            bits = int.from_bytes(data[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            # 扩展格式，24位的宽-1、高-1
+            return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+        return None
+    if data[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 9 <= len(data):
+            if data[pos] != 0xFF:
+                return None
+            marker = data[pos + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                pos += 2
+                continue
+            length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+            # SOF0-SOF15，除去DHT、JPG、DAC
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return width, height
+            pos += 2 + length
+    return None
+
+
+def decode(data: bytes, max_pixels: int = None):
+    """
+    解码图片，解码前先检查像素数，避免解码超大图片占满内存
+    Args:
+        data: 图片文件内容
+        max_pixels: 允许的最大像素数，默认为REVIEW_MEDIA_MAX_PIXELS
+
+    Returns:
+        BGR图像
+
+    Raises:
+        UnsupportedMedia: 无法从文件头识别格式和宽高
+        MediaTooLarge: 像素数超过上限
+    """
+    import cv2 as cv
+    import numpy as np
+
+    max_pixels = max_pixels or env.MEDIA_MAX_PIXELS
+    size = image_size(data)
+    if size is None:
+        raise UnsupportedMedia(f"unsupported image format {data[:12]!r}")
+    if size[0] * size[1] > max_pixels:
+        raise MediaTooLarge(f"image size {size} exceeds {max_pixels} pixels")
+    image = cv.imdecode(np.frombuffer(data, np.uint8), cv.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Error in cv2.imdecode")
+    return image
+
+
+class MediaCache(object):
+    """
+    按内容寻址的图片磁盘缓存
+
+    图片以百度图床hash（由图片内容决定，转发的同一张图hash相同）为键保存在path下，没有hash时使用链接的摘要。
+    总大小超过max_size时按最近使用时间淘汰；同时下载的数量不超过concurrency，
+    同一张图片正在下载时，其他请求等待同一次下载的结果
+
+    Attributes:
+        path: 缓存目录
+        max_size: 缓存总大小上限（单位：字节）
+        max_file_size: 单个文件大小上限（单位：字节），超过时中止下载
+        size: 当前缓存总大小
+    """
+
+    def __init__(self, path: str = MEDIA_PATH, max_size: int = None, max_file_size: int = None,
+                 concurrency: int = None, timeout: float = None):
+        self.path = path
+        self.max_size = max_size or env.MEDIA_CACHE_SIZE
+        self.max_file_size = max_file_size or env.MEDIA_MAX_FILE_SIZE
+        self.timeout = timeout or env.MEDIA_TIMEOUT
+        self.concurrency = concurrency or env.MEDIA_CONCURRENCY
+        self.size = 0
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.evicted = 0
+        self.unsupported = 0
+        self.too_large = 0
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    @staticmethod
+    def key(url: str, content_hash: str = None) -> str:
+        if content_hash and _KEY_EXP.fullmatch(content_hash):
+            return content_hash.lower()
+        return hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+
+    def load(self):
+        """
+        扫描缓存目录重建索引，按修改时间排列
+        """
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                st = os.stat(os.path.join(root, name))
+                entries.append((st.st_mtime, name, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self.size = sum(self._index.values())
+        self._remove(self._evict())
+        logger.info(f"[review] media cache loaded, {len(self._index)} files, {self.size} bytes")
+
+    @staticmethod
+    def _read_file(file: str) -> bytes:
+        with open(file, "rb") as f:
+            data = f.read()
+        os.utime(file)
+        return data
+
+    @staticmethod
+    def _write_file(file: str, data: bytes):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with open(f"{file}.tmp", "wb") as f:
+            f.write(data)
+        os.replace(f"{file}.tmp", file)
+
+    @staticmethod
+    def _remove(files: List[str]):
+        for file in files:
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+
+    async def _read(self, key: str) -> Optional[bytes]:
+        # 文件读写放到线程中，索引只在事件循环中修改
+        try:
+            data = await asyncio.to_thread(self._read_file, self._file(key))
+        except FileNotFoundError:
+            self.size -= self._index.pop(key, 0)
+            return None
+        if key in self._index:
+            self._index.move_to_end(key)
+        return data
+
+    async def _store(self, key: str, data: bytes):
+        await asyncio.to_thread(self._write_file, self._file(key), data)
+        self.size += len(data) - self._index.get(key, 0)
+        self._index[key] = len(data)
+        self._index.move_to_end(key)
+        if files := self._evict():
+            await asyncio.to_thread(self._remove, files)
+
+    def _evict(self) -> List[str]:
+        """
+        按最近使用时间从索引中移除文件直到总大小不超过max_size
+
+        Returns:
+            需要删除的文件路径
+        """
+        files = []
+        while self.size > self.max_size and self._index:
+            key, size = self._index.popitem(last=False)
+            self.size -= size
+            self.evicted += 1
+            files.append(self._file(key))
+        return files
+
+    async def _download(self, url: str) -> bytes:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        async with self._semaphore:
+            async with self._session.get(url) as resp:
+                if resp.status != 200:
+                    raise HTTPStatusError(resp.status, resp.reason)
+                if (resp.content_length or 0) > self.max_file_size:
+                    raise MediaTooLarge(f"{resp.content_length} bytes")
+                data = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    data += chunk
+                    if len(data) > self.max_file_size:
+                        raise MediaTooLarge(f"more than {self.max_file_size} bytes")
+                return bytes(data)
+
+    async def get(self, url: str, content_hash: str = None) -> Optional[bytes]:
+        """
+        获取图片文件内容，优先读取缓存
+        Args:
+            url: 图片链接
+            content_hash: 百度图床hash
+
+        Returns:
+            文件内容，下载失败或文件过大时为None
+        """
+        key = self.key(url, content_hash)
+        if key in self._index and (data := await self._read(key)) is not None:
+            self.hits += 1
+            return data
+        if (future := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        data = None
+        try:
+            data = await self._download(url)
+            await self._store(key, data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.debug(f"[review] failed to download {url}: {e!r}")
+        finally:
+            del self._inflight[key]
+            future.set_result(data)
+        return data
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self):
+        return {
+            "files": len(self._index),
+            "size": self.size,
+            "max_size": self.max_size,
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "evicted": self.evicted,
+            "unsupported": self.unsupported,
+            "too_large": self.too_large,
+        }
+
+
+media = MediaCache()
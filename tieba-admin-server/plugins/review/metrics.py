@@ -0,0 +1,180 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# 阶段耗时直方图的桶上界（单位：秒）
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metric(ABC):
+    """
+    指标基类
+
+    Attributes:
+        name: 指标名
+        help: 说明
+    """
+    TYPE = ""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+
+    @abstractmethod
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        pass
+
+    def collect(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "type": self.TYPE,
+            "help": self.help,
+            "samples": [[name, dict(labels), value] for name, labels, value in self.samples()],
+        }
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, value: float = 1, **labels):
+        key = _key(labels)
+        self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """
+    可以直接设置的指标，也可以用track注册取值函数，在collect时取当前值
+    """
+    TYPE = "gauge"
+
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.functions: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        self.values[_key(labels)] = value
+
+    def track(self, func: Callable[[], float], **labels):
+        self.functions[_key(labels)] = func
+
+    def samples(self):
+        values = {**self.values, **{key: func() for key, func in self.functions.items()}}
+        return [(self.name, key, value) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        super().__init__(name, help)
+        self.buckets = buckets
+        self.values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        """
+        记录一次观测值，values中依次为各桶计数、总和、总数
+        """
+        key = _key(labels)
+        if key not in self.values:
+            self.values[key] = [0] * (len(self.buckets) + 2)
+        counts = self.values[key]
+        if (index := bisect_left(self.buckets, value)) < len(self.buckets):
+            counts[index] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        rst = []
+        for key, counts in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                rst.append((f"{self.name}_bucket", key + (("le", str(bound)),), cumulative))
+            rst.append((f"{self.name}_bucket", key + (("le", "+Inf"),), counts[-1]))
+            rst.append((f"{self.name}_sum", key, counts[-2]))
+            rst.append((f"{self.name}_count", key, counts[-1]))
+        return rst
+
+
+class Metrics(object):
+    """
+    插件进程中的审查指标
+
+    插件进程每隔REVIEW_METRICS_INTERVAL通过状态文件导出collect()的结果，接口进程用render()转换为Prometheus文本格式。
+    并发数、队列深度等瞬时值在collect时取值，审查进行中导出的才是繁忙时的值
+
+    Attributes:
+        fetched: 从贴吧获取的对象数
+        checked: 经过checker检查的新对象数
+        acted: 需要执行吧务操作的对象数
+        stage: 各阶段耗时，fetch为请求贴吧，normalize为规范化文本，check为执行checker，db为读写审查记录，execute为执行吧务操作
+        semaphore: 正在使用的请求并发数
+        queue: 吧务操作队列深度
+        cycle: 每个贴吧最近一轮审查的耗时
+        stage_items: 流水线各阶段处理的任务数
+        stage_queue: 流水线各阶段的队列深度
+        stage_busy: 流水线各阶段正在工作的worker数
+        verdict_cache: 检查结论缓存的命中与未命中次数
+    """
+
+    def __init__(self):
+        self.fetched = Counter("review_objects_fetched_total", "Objects fetched from tieba")
+        self.checked = Counter("review_objects_checked_total", "New objects passed through checkers")
+        self.acted = Counter("review_objects_acted_total", "Objects with a non-empty verdict")
+        self.stage = Histogram("review_stage_seconds", "Latency of each review stage")
+        self.semaphore = Gauge("review_semaphore_in_use", "Tieba requests in flight")
+        self.queue = Gauge("review_dispatch_queue_depth", "Executors waiting in the dispatch queue")
+        self.cycle = Gauge("review_cycle_seconds", "Duration of the last review cycle")
+        self.stage_items = Counter("review_pipeline_items_total", "Items processed by each pipeline stage")
+        self.stage_queue = Gauge("review_pipeline_queue_depth", "Items waiting in each pipeline stage")
+        self.stage_busy = Gauge("review_pipeline_busy_workers", "Busy workers of each pipeline stage")
+        self.verdict_cache = Counter("review_verdict_cache_total", "Verdict cache lookups by result")
+
+    def collect(self) -> List[Dict[str, Any]]:
+        return [m.collect() for m in vars(self).values() if isinstance(m, Metric)]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def render(collected: List[Dict[str, Any]]) -> str:
+    """
+    将collect()的结果转换为Prometheus文本格式
+    """
+    lines = []
+    for metric in collected:
+        lines.append(f"# HELP {metric['name']} {metric['help']}")
+        lines.append(f"# TYPE {metric['name']} {metric['type']}")
+        for name, labels, value in metric["samples"]:
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
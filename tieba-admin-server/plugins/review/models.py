@@ -11,7 +11,7 @@ class Thread(Model):
     """
     tid = fields.BigIntField(pk=True)
     fid = fields.BigIntField()
-    last_time = fields.BigIntField()
+    last_time = fields.BigIntField(index=True)
     date_created: datetime = fields.DatetimeField(auto_now_add=True)
     date_updated: datetime = fields.DatetimeField(auto_now=True)
 
@@ -26,11 +26,11 @@ class Post(Model):
     Notes: 有记录的楼层及楼中楼不代表已经检查过，当检查过程中终止程序，可能会有楼层及楼中楼未被检查
     """
     pid = fields.BigIntField(pk=True)
-    tid = fields.BigIntField()
+    tid = fields.BigIntField(index=True)
     ppid = fields.BigIntField(null=True, default=None)
     reply_num = fields.IntField(null=True, default=None)
     date_created: datetime = fields.DatetimeField(auto_now_add=True)
-    date_updated: datetime = fields.DatetimeField(auto_now=True)
+    date_updated: datetime = fields.DatetimeField(auto_now=True, index=True)
 
     class Meta:
         table = "review_post"
@@ -82,3 +82,61 @@ class Keyword(Model):
 
     class Meta:
         table = "review_keyword"
+
+
+class ImageHash(Model):
+    """
+    记录图片审查所使用的图片感知哈希
+    """
+    hash = fields.CharField(max_length=16, pk=True)
+    note = fields.CharField(max_length=64, default="")
+    date_created: datetime = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "review_image_hash"
+
+    def to_json(self):
+        return {
+            "hash": self.hash,
+            "note": self.note,
+        }
+
+
+class Rule(Model):
+    """
+    记录正则规则审查所使用的规则
+
+    Attributes:
+        types: 适用的对象类型，逗号分隔的thread、post、comment
+        min_level: 适用的最低等级
+        max_level: 适用的最高等级
+        action: 命中后的操作，delete、block、hide或black
+        day: 操作持续时间（单位：天）
+    """
+    id = fields.IntField(pk=True)
+    pattern = fields.CharField(max_length=256)
+    types = fields.CharField(max_length=32, default="thread,post,comment")
+    min_level = fields.IntField(default=1)
+    max_level = fields.IntField(default=18)
+    action = fields.CharField(max_length=8, default="delete")
+    day = fields.IntField(default=0)
+    enable = fields.BooleanField(default=True)
+    note = fields.CharField(max_length=64, default="")
+    date_created: datetime = fields.DatetimeField(auto_now_add=True)
+    date_updated: datetime = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "review_rule"
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "pattern": self.pattern,
+            "types": self.types.split(","),
+            "min_level": self.min_level,
+            "max_level": self.max_level,
+            "action": self.action,
+            "day": self.day,
+            "enable": self.enable,
+            "note": self.note,
+        }
@@ -0,0 +1,70 @@
+import unicodedata
+from typing import Union
+
+from aiotieba.typing import Thread, Post, Comment
+
+# 直接删除的Unicode类别：格式字符（零宽字符等）、控制字符、组合符号、空白、标点、符号（含emoji）
+REMOVED_CATEGORIES = {"Cf", "Cc", "Mn", "Me", "Zs", "Zl", "Zp",
+                      "Pc", "Pd", "Ps", "Pe", "Pi", "Pf", "Po",
+                      "Sm", "Sc", "Sk", "So"}
+
+# NFKC不会合并的常见形近字母，均为小写
+HOMOGLYPHS = {
+    # 西里尔字母
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i", "ј": "j", "ԁ": "d",
+    "ԛ": "q", "ԝ": "w", "ь": "b",
+    # 希腊字母
+    "α": "a", "β": "b", "ε": "e", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p", "τ": "t",
+    "υ": "u", "χ": "x", "ω": "w",
+}
+
+_ATTR = "_review_normalized"
+
+
+class _Table(dict):
+    """
+    str.translate使用的映射表，第一次遇到某个字符时才计算其映射并缓存
+    """
+
+    def __missing__(self, code: int):
+        char = chr(code)
+        if char in HOMOGLYPHS:
+            value = HOMOGLYPHS[char]
+        elif unicodedata.category(char) in REMOVED_CATEGORIES:
+            value = None
+        else:
+            value = code
+        self[code] = value
+        return value
+
+
+_table = _Table()
+
+
+def normalize(text: str) -> str:
+    """
+    把文本转换为便于匹配的规范形式
+
+    依次做NFKC（全角、圈字母等兼容字符转为普通字符）、大小写折叠、形近字母替换，
+    并删除零宽字符、空白、标点与符号，例如"加 Ｖ．х"会变为"加vx"
+    Args:
+        text: 原文本
+
+    Returns:
+        规范化后的文本
+    """
+    if not text:
+        return ""
+    return unicodedata.normalize("NFKC", text).casefold().translate(_table)
+
+
+def normalized_text(obj: Union[Thread, Post, Comment]) -> str:
+    """
+    获取对象文本的规范形式，每个对象只计算一次，结果缓存在对象上供所有checker共用
+    """
+    try:
+        return obj.__dict__[_ATTR]
+    except KeyError:
+        value = obj.__dict__[_ATTR] = normalize(obj.text)
+        return value
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Any, Callable, Coroutine, List, Optional, Tuple
+
+from sanic.log import logger
+
+from core.client import Client
+from .metrics import metrics
+
+
+class Cycle(object):
+    """
+    一个贴吧的一轮审查
+
+    各阶段处理本轮任务时可能向下游阶段放入新任务，放入时计数加一、处理完毕减一，计数归零即本轮结束。
+    审查记录在本轮结束后才统一写入，检查出错或未执行的对象不会被记为已审查。
+    本轮被取消后，队列中剩余的任务直接丢弃，不再检查或执行操作
+
+    Attributes:
+        client: 本轮使用的贴吧客户端
+        fname: 贴吧名
+        pending: 尚未处理完的任务数
+        new_objects: 本轮发现的新主题贴、楼层、楼中楼总数
+        checked: 检查完毕的新对象，元素见reviewer.record
+        updated: 回复数或最后回复时间发生变化的主题贴、楼层，元素见reviewer.record
+        failures: 处理出错的(阶段名, 任务)
+        cancelled: 本轮是否已被取消
+    """
+
+    def __init__(self, client: Client, fname: str):
+        self.client = client
+        self.fname = fname
+        self.pending = 0
+        self.new_objects = 0
+        self.checked: List[Tuple[str, int, int, int]] = []
+        self.updated: List[Tuple[str, int, int, int]] = []
+        self.failures: List[Tuple[str, Any]] = []
+        self.cancelled = False
+        self._done = asyncio.Event()
+        self._done.set()
+
+    def add(self):
+        self.pending += 1
+        self._done.clear()
+
+    def fail(self, stage: str, item: Any):
+        self.failures.append((stage, item))
+
+    def cancel(self):
+        self.cancelled = True
+
+    def finish(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self._done.set()
+
+    async def wait(self):
+        """
+        等待本轮所有任务处理完毕
+        """
+        await self._done.wait()
+
+
+Handler = Callable[[Cycle, Any], Coroutine[Any, Any, None]]
+
+
+class Stage(object):
+    """
+    审查流水线中的一个阶段
+
+    任务放入有界队列，由固定数量的worker处理，队列满时放入方等待，上游因此不会无限制地产生任务
+
+    Attributes:
+        name: 阶段名
+        workers: worker数量
+        maxsize: 队列容量
+        processed: 已处理的任务数
+        failed: 处理出错的任务数
+        busy: 正在处理任务的worker数
+    """
+
+    def __init__(self, name: str, workers: int, maxsize: int, handler: Handler):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queue: Optional[asyncio.Queue] = None
+        self._handler = handler
+        self._tasks: List[asyncio.Task] = []
+
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.time_total = 0.0
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def put(self, cycle: Cycle, item: Any):
+        cycle.add()
+        await self.queue.put((cycle, item))
+
+    async def _worker(self):
+        while True:
+            cycle, item = await self.queue.get()
+            self.busy += 1
+            start = time.perf_counter()
+            try:
+                if not cycle.cancelled:
+                    await self._handler(cycle, item)
+            except Exception as e:
+                logger.warning(f"[review] {self.name} stage failed in {cycle.fname}: {e!r}")
+                self.failed += 1
+                cycle.fail(self.name, item)
+            finally:
+                self.busy -= 1
+                self.processed += 1
+                self.time_total += time.perf_counter() - start
+                metrics.stage_items.inc(stage=self.name)
+                cycle.finish()
+                self.queue.task_done()
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.maxsize,
+            "processed": self.processed,
+            "failed": self.failed,
+            "time_avg": round(self.time_total / self.processed, 4) if self.processed else 0,
+        }
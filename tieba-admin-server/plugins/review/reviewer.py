@@ -1,21 +1,64 @@
 import asyncio
-import random
+import cProfile
+import importlib.util
+import io
+import pstats
+import time
 from asyncio import sleep
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, Set, Tuple, Union
 
-from aiotieba import Client, PostSortType, logging
+from aiotieba import PostSortType, logging
 from aiotieba.typing import Threads, Thread, Posts, Post, Comments, Comment
 from sanic.log import logger
 from tortoise import Tortoise, connections, ConfigurationError
+from tortoise.transactions import in_transaction
 
+from core.cache import caches
+from core.client import Client, clients
 from core.models import ForumUserPermission, User, Config, Permission
 from core.plugin import BasePlugin
-from . import execute
-from .checker import CheckMap, manager
+from . import execute, env
+from .checker import CheckMap, OFFICES_ID, manager, enabled_check_map, keyword_matcher, rule_matcher
+from .compaction import Compactor
+from .dispatcher import Dispatcher
+from .interval import PollInterval
+from .media import media
+from .metrics import metrics
 from .models import Forum as RForum
 from .models import Function as RFunction
 from .models import Post as RPost
 from .models import Thread as RThread
+from .normalize import normalized_text
+from .pipeline import Cycle, Stage
+from .seen import SeenSet
+from .status import status
+from .verdicts import VerdictCache
+
+
+def record(_type: str, obj: Union[Thread, Post, Comment]) -> Tuple[str, int, int, int]:
+    """
+    对象写入审查记录所需的信息，避免本轮结束前一直持有对象
+
+    Returns:
+        主题贴为(thread, tid, fid, last_time)，楼层为(post, tid, pid, reply_num)，楼中楼为(comment, tid, pid, ppid)
+    """
+    if _type == "thread":
+        return _type, obj.tid, obj.fid, obj.last_time
+    if _type == "post":
+        return _type, obj.tid, obj.pid, obj.reply_num
+    return _type, obj.tid, obj.pid, obj.ppid
+
+
+@caches.register("forum_account", version="permission")
+async def forum_accounts() -> Dict[str, User]:
+    """
+    每个贴吧权限最高且登录过的吧务账号
+    """
+    rank = Permission.all()
+    fups = await ForumUserPermission.filter(permission__in=Permission.min()).prefetch_related("user")
+    fups.sort(key=lambda f: rank.index(f.permission))
+    return {fup.fname: fup.user for fup in fups if fup.user.BDUSS}
 
 
 class Reviewer(BasePlugin):
@@ -30,68 +73,172 @@ class Reviewer(BasePlugin):
         self.FUP: ForumUserPermission = None
         self.no_exec = True
         self.check_name_map = manager.check_name_map
-        self.semaphore = asyncio.Semaphore(8)
+        self.semaphore = asyncio.Semaphore(env.CONCURRENCY)
+        self.forum_semaphore = asyncio.Semaphore(env.FORUM_CONCURRENCY)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.last_times: Dict[str, List[int]] = {}
+        self.front_page: Dict[str, Set[int]] = {}
+        self.dispatcher = Dispatcher(env.EXEC_WORKERS, env.EXEC_QUEUE_SIZE,
+                                     env.LOG_FLUSH_SIZE, env.LOG_FLUSH_INTERVAL)
+        self.seen = SeenSet(env.SEEN_RECENT_SIZE, env.SEEN_BLOOM_CAPACITY, env.SEEN_BLOOM_ERROR_RATE,
+                            snapshot_interval=env.SEEN_SNAPSHOT_INTERVAL)
+        self.post_stage = Stage("post", env.POST_WORKERS, env.STAGE_QUEUE_SIZE, self.check_posts)
+        self.comment_stage = Stage("comment", env.COMMENT_WORKERS, env.STAGE_QUEUE_SIZE, self.check_comment)
+        self.check_stage = Stage("check", env.CHECK_WORKERS, env.STAGE_QUEUE_SIZE, self.check)
+        self.profiling = False
+        self.compactor = Compactor(env.RETENTION_DAYS, env.COMPACT_BATCH_SIZE, env.COMPACT_INTERVAL,
+                                   protected=lambda: set().union(*self.front_page.values()))
+        self.verdicts = VerdictCache(env.VERDICT_CACHE_SIZE,
+                                     [enabled_check_map, keyword_matcher, rule_matcher])
+
+    @asynccontextmanager
+    async def request(self):
+        """
+        限制请求贴吧的并发数，并记录请求耗时
+        """
+        async with self.semaphore:
+            with metrics.stage.time(stage="fetch"):
+                yield
+
+    @property
+    def stages(self) -> List[Stage]:
+        return [self.post_stage, self.comment_stage, self.check_stage]
+
+    async def start_pipeline(self):
+        await self.dispatcher.start()
+        for stage in self.stages:
+            await stage.start()
+
+    async def stop_pipeline(self):
+        """
+        停止各阶段的worker，等待已放入分发器的操作执行完毕
+        """
+        for stage in self.stages:
+            await stage.stop()
+        await self.dispatcher.stop()
 
-    async def check_threads(self, client: Client, fname: str):
+    async def check_threads(self, client: Client, fname: str) -> int:
         """
-        检查主题贴的内容
+        一轮审查的入口，获取首页主题贴，新的主题贴送入检查阶段，有新回复的主题贴送入楼层阶段，
+        等待本轮在各阶段产生的任务全部处理完毕后写入审查记录
         Args:
             client: 传入了执行账号的贴吧客户端
             fname: 贴吧名
 
+        Returns:
+            int: 新的主题贴、楼层、楼中楼总数
         """
-        async with self.semaphore:
+        cycle = Cycle(client, fname)
+        try:
+            await self.run_cycle(cycle)
+        except asyncio.CancelledError:
+            # 已放入队列的任务不再检查，已执行过操作的对象仍需记录，否则下一轮会重复执行
+            cycle.cancel()
+            await asyncio.shield(self.persist(cycle))
+            raise
+        await self.persist(cycle)
+        return cycle.new_objects
+
+    async def run_cycle(self, cycle: Cycle):
+        """
+        获取首页主题贴并把任务送入各阶段，等待本轮任务全部处理完毕
+        """
+        client, fname = cycle.client, cycle.fname
+        async with self.request():
             first_threads: Threads = await client.get_threads(fname)
 
-        need_next_check: List[Thread] = []
+        threads = {thread.tid: thread for thread in first_threads if not thread.is_livepost}
+        metrics.fetched.inc(len(threads), type="thread")
+        self.last_times[fname] = [thread.last_time for thread in threads.values()]
+        self.front_page[fname] = set(threads)
+        with metrics.stage.time(stage="db"):
+            prev_last_time = dict(await RThread.filter(tid__in=list(threads)).values_list("tid", "last_time"))
 
-        async def check_and_execute(ce_thread: Thread):
-            executor = execute.Executor(client=client, obj=ce_thread)
-
-            async def get_execute(_check):
-                func_enable = await RFunction.get(function=_check['function'].__name__)
-                if not func_enable.enable:
-                    return None
-                _executor = await _check['function'](ce_thread, client)
-                if not _executor:
-                    raise TypeError("Need to return Executor object")
-                executor.exec_compare(_executor)
-
-            await asyncio.gather(*[get_execute(check) for check in self.check_map['thread']])
+        need_next_check: List[Thread] = []
+        new_threads: List[Thread] = []
+        updated_threads: List[Thread] = []
+        for thread in threads.values():
+            last_time = prev_last_time.get(thread.tid)
+            if last_time is None:
+                new_threads.append(thread)
+                need_next_check.append(thread)
+            elif thread.last_time != last_time:
+                updated_threads.append(thread)
+                if thread.last_time > last_time:
+                    need_next_check.append(thread)
+
+        cycle.new_objects += len(new_threads)
+        for thread in new_threads:
+            await self.check_stage.put(cycle, ("thread", thread))
+        cycle.updated.extend(record("thread", thread) for thread in updated_threads)
+
+        for thread in need_next_check:
+            await self.post_stage.put(cycle, thread.tid)
+        await cycle.wait()
+
+    async def persist(self, cycle: Cycle):
+        """
+        本轮结束后写入审查记录
 
-            if not self.no_exec:
-                await executor.run()
+        只写入检查完毕的新对象。某个主题贴下有任务出错时，该主题贴及其楼层的最后回复时间、回复数不更新，
+        新记录的最后回复时间、回复数记为0，下一轮会重新获取其楼层与楼中楼，已检查过的对象不会重复检查。
+        本轮被取消时所有主题贴都按出错处理
+        Args:
+            cycle: 已结束或已取消的一轮审查
+        """
+        failed = set()
+        if cycle.cancelled:
+            failed.update(r[1] for r in cycle.checked)
+            failed.update(r[1] for r in cycle.updated)
+        for stage, item in cycle.failures:
+            if stage == "post":
+                failed.add(item)
+            elif stage == "comment":
+                failed.add(item.tid)
             else:
-                logger.debug(f"[review] [Thread] {executor}")
-
-        async def check_last_time(clt_thread: Thread):
-            if clt_thread.is_livepost:
-                return None
-            prev_thread = await RThread.filter(tid=clt_thread.tid).get_or_none()
-            if prev_thread:
-                if clt_thread.last_time < prev_thread.last_time:
-                    await RThread.filter(tid=clt_thread.tid).update(last_time=clt_thread.last_time)
-                elif clt_thread.last_time > prev_thread.last_time:
-                    need_next_check.append(clt_thread)
-                    await RThread.filter(tid=clt_thread.tid).update(last_time=clt_thread.last_time)
+                failed.add(item[1].tid)
+
+        new_threads, new_posts, new_comments = [], [], []
+        for _type, tid, _id, value in cycle.checked:
+            if _type == "thread":
+                new_threads.append(RThread(tid=tid, fid=_id, last_time=0 if tid in failed else value))
+            elif _type == "post":
+                new_posts.append(RPost(pid=_id, tid=tid, reply_num=0 if tid in failed else value))
             else:
-                need_next_check.append(clt_thread)
-                await check_and_execute(clt_thread)
-                await RThread.create(tid=clt_thread.tid, fid=await client.get_fid(fname),
-                                     last_time=clt_thread.last_time)
-
-        await asyncio.gather(*[check_last_time(thread) for thread in first_threads])
-
-        await asyncio.gather(*[self.check_posts(client, thread.tid) for thread in need_next_check])
-
-    async def check_posts(self, client: Client, tid: int):
+                new_comments.append(RPost(pid=_id, tid=tid, ppid=value))
+        updated_threads, updated_posts = [], []
+        for _type, tid, _id, value in cycle.updated:
+            if tid in failed:
+                continue
+            if _type == "thread":
+                updated_threads.append(RThread(tid=tid, fid=_id, last_time=value))
+            else:
+                updated_posts.append(RPost(pid=_id, tid=tid, reply_num=value))
+
+        if not (new_threads or new_posts or new_comments or updated_threads or updated_posts):
+            return
+        with metrics.stage.time(stage="db"):
+            async with in_transaction() as conn:
+                if new_threads:
+                    await RThread.bulk_create(new_threads, ignore_conflicts=True, using_db=conn)
+                if updated_threads:
+                    await RThread.bulk_update(updated_threads, fields=["last_time"], using_db=conn)
+                if new_posts or new_comments:
+                    await RPost.bulk_create(new_posts + new_comments, ignore_conflicts=True, using_db=conn)
+                if updated_posts:
+                    await RPost.bulk_update(updated_posts, fields=["reply_num"], using_db=conn)
+        self.seen.add({p.pid: p.reply_num for p in new_posts + updated_posts})
+        self.seen.add({c.pid: None for c in new_comments})
+
+    async def check_posts(self, cycle: Cycle, tid: int):
         """
-        检查楼层内容
+        楼层阶段，获取主题贴的楼层，新的楼层送入检查阶段，有新楼中楼的楼层送入楼中楼阶段
         Args:
-            client: 传入了执行账号的贴吧客户端
+            cycle: 所属的一轮审查
             tid: 所在主题贴id
         """
-        async with self.semaphore:
+        client = cycle.client
+        async with self.request():
             last_posts: Posts = await client.get_posts(
                 tid,
                 pn=0xFFFF,
@@ -107,21 +254,21 @@ class Reviewer(BasePlugin):
                 post_set = set(last_posts.objs)
                 rn_clamp = 30
                 if need_rn <= rn_clamp:
-                    async with self.semaphore:
+                    async with self.request():
                         first_posts = await client.get_posts(
                             tid, rn=need_rn, with_comments=True, comment_rn=10
                         )
 
                     post_set.update(first_posts.objs)
                 else:
-                    async with self.semaphore:
+                    async with self.request():
                         first_posts = await client.get_posts(
                             tid, rn=rn_clamp, with_comments=True, comment_rn=10
                         )
 
                     post_set.update(first_posts.objs)
 
-                    async with self.semaphore:
+                    async with self.request():
                         hot_posts = await client.get_posts(
                             tid, sort=PostSortType.HOT, with_comments=True, comment_rn=10
                         )
@@ -133,58 +280,43 @@ class Reviewer(BasePlugin):
         else:
             posts = last_posts.objs
 
-        need_next_check: List[Post] = []
-
-        async def check_and_execute(ce_post: Post):
-            executor = execute.Executor(client=client, obj=ce_post)
-
-            async def get_execute(_check):
-                func_enable = await RFunction.get(function=_check['function'].__name__)
-                if not func_enable.enable:
-                    return None
-                _executor = await _check['function'](ce_post, client)
-                if not _executor:
-                    raise TypeError("Need to return Executor object")
-                executor.exec_compare(_executor)
-
-            await asyncio.gather(*[get_execute(check) for check in self.check_map['post']])
-
-            if not self.no_exec:
-                await executor.run()
-            else:
-                logger.debug(f"[review] [Post] {executor}")
-
-        async def check_reply_num(crn_post: Post):
-            prev_post = await RPost.filter(pid=crn_post.pid).get_or_none()
-            if prev_post:
-                if crn_post.reply_num < prev_post.reply_num:
-                    await RPost.filter(pid=crn_post.pid).update(reply_num=crn_post.reply_num)
-                elif crn_post.reply_num > prev_post.reply_num:
-                    need_next_check.append(crn_post)
-                    await RPost.filter(pid=crn_post.pid).update(reply_num=crn_post.reply_num)
-            else:
-                need_next_check.append(crn_post)
-                await check_and_execute(crn_post)
-                await RPost.create(pid=crn_post.pid, tid=tid, reply_num=crn_post.reply_num)
+        posts = {post.pid: post for post in posts}
+        metrics.fetched.inc(len(posts), type="post")
+        with metrics.stage.time(stage="db"):
+            prev_reply_num = await self.seen.lookup(posts)
 
-        await asyncio.gather(*[check_reply_num(post) for post in posts])
-
-        await asyncio.gather(
-            *[self.check_comment(client, post) for post in need_next_check]
-        )
-
-    async def check_comment(self, client: Client, post: Post):
+        need_next_check: List[Post] = []
+        new_posts: List[Post] = []
+        updated_posts: List[Post] = []
+        for post in posts.values():
+            if post.pid not in prev_reply_num:
+                new_posts.append(post)
+                need_next_check.append(post)
+            elif post.reply_num != prev_reply_num[post.pid]:
+                updated_posts.append(post)
+                if post.reply_num > (prev_reply_num[post.pid] or 0):
+                    need_next_check.append(post)
+
+        cycle.new_objects += len(new_posts)
+        for post in new_posts:
+            await self.check_stage.put(cycle, ("post", post))
+        cycle.updated.extend(record("post", post) for post in updated_posts)
+
+        for post in need_next_check:
+            await self.comment_stage.put(cycle, post)
+
+    async def check_comment(self, cycle: Cycle, post: Post):
         """
-        检查楼中楼内容
+        楼中楼阶段，获取楼层的楼中楼，新的楼中楼送入检查阶段
         Args:
-            client: 传入了执行账号的贴吧客户端
+            cycle: 所属的一轮审查
             post: 楼层
         """
-
+        client = cycle.client
         if post.reply_num > 10 or \
                 (len(post.comments) != post.reply_num and post.reply_num <= 10):
 
-            async with self.semaphore:
+            async with self.request():
                 last_comments: Comments = await client.get_comments(
                     post.tid, post.pid, pn=post.reply_num // 30 + 1
                 )
@@ -195,50 +327,208 @@ class Reviewer(BasePlugin):
         else:
             comments = post.comments
 
-        async def check_and_execute(cae_comment: Comment):
-            executor = execute.Executor(client=client, obj=cae_comment)
+        comments = {comment.pid: comment for comment in comments}
+        metrics.fetched.inc(len(comments), type="comment")
+        with metrics.stage.time(stage="db"):
+            prev_pids = await self.seen.lookup(comments)
+        new_comments = [comment for comment in comments.values() if comment.pid not in prev_pids]
 
-            async def get_execute(_check):
-                func_enable = await RFunction.get(function=_check['function'].__name__)
-                if not func_enable.enable:
-                    return None
-                _executor = await _check['function'](cae_comment, client)
-                if not _executor:
-                    raise TypeError("Need to return Executor object")
-                executor.exec_compare(_executor)
+        cycle.new_objects += len(new_comments)
+        for comment in new_comments:
+            await self.check_stage.put(cycle, ("comment", comment))
 
-            await asyncio.gather(*[get_execute(check) for check in self.check_map['comment']])
+    async def check(self, cycle: Cycle, item: Tuple[str, Union[Thread, Post, Comment]]):
+        """
+        检查阶段，先规范化对象文本供所有checker共用，再使用已启用的checker检查对象，需要执行的操作交给分发器
 
-            if not self.no_exec:
-                await executor.run()
+        相同内容的cacheable checker结论从verdicts中复用，只执行其余checker
+        Args:
+            cycle: 所属的一轮审查
+            item: (对象类型, 主题贴/楼层/楼中楼)
+        """
+        _type, obj = item
+        check_map: CheckMap = await enabled_check_map.get()
+        with metrics.stage.time(stage="normalize"):
+            normalized_text(obj)
+        executor = execute.Executor(client=cycle.client, obj=obj)
+        checks = check_map[_type]
+
+        # 吧务小管家会被ignore_office跳过，其结论不能给其他账号复用
+        key = cached = None
+        if obj.user.user_id not in OFFICES_ID and any(c.get('cacheable') for c in checks):
+            await self.verdicts.validate()
+            key = self.verdicts.key(_type, obj)
+            if (hit := self.verdicts.get(key, cycle.client, obj)) is not None:
+                metrics.verdict_cache.inc(result="hit")
+                executor.exec_compare(hit)
+                checks = [c for c in checks if not c.get('cacheable')]
             else:
-                logger.debug(f"[review] [Comment] {executor}")
+                metrics.verdict_cache.inc(result="miss")
+                cached = execute.Executor(client=cycle.client, obj=obj)
+
+        inconclusive = False
+
+        async def get_execute(_check):
+            nonlocal inconclusive
+            try:
+                _executor = await manager.run(_check, obj, cycle.client, _type)
+            except asyncio.TimeoutError:
+                # 超时的checker没有结论，本次放行，也不能缓存其余cacheable checker合并后的结论
+                inconclusive = True
+                return
+            if not _executor:
+                raise TypeError("Need to return Executor object")
+            if cached is not None and _check.get('cacheable'):
+                cached.exec_compare(_executor)
+            else:
+                executor.exec_compare(_executor)
 
-        async def check_comment_of_db(ccod_comment: Comment):
-            prev_comment = await RPost.filter(pid=ccod_comment.pid).get_or_none()
-            if not prev_comment:
-                await check_and_execute(ccod_comment)
-                await RPost.create(pid=ccod_comment.pid, tid=ccod_comment.tid, ppid=post.pid)
+        with metrics.stage.time(stage="check"):
+            await asyncio.gather(*[get_execute(check) for check in checks])
+        if cached is not None:
+            if not inconclusive:
+                self.verdicts.put(key, cached)
+            executor.exec_compare(cached)
+        metrics.checked.inc(type=_type)
+
+        # 先记录再放入分发器，中间没有await，本轮被取消时执行了操作的对象一定会被写入审查记录
+        if cycle.cancelled:
+            return
+        cycle.checked.append(record(_type, obj))
+        if not self.no_exec:
+            if executor.need_execute:
+                metrics.acted.inc(type=_type)
+                await self.dispatcher.put(executor)
+        else:
+            logger.debug(f"[review] [{_type.capitalize()}] {executor}")
+
+    async def take_profile_request(self) -> bool:
+        """
+        读取并清除采样请求，返回True时调用方必须接着调用profile_threads
+
+        在第一次await之前占用profiling，避免多个贴吧同时读到请求并各自启用cProfile
+        """
+        if self.profiling:
+            return False
+        self.profiling = True
+        try:
+            if requested := await Config.get_bool("REVIEW_PROFILE"):
+                await Config.set_config("REVIEW_PROFILE", False)
+        except BaseException:
+            self.profiling = False
+            raise
+        if not requested:
+            self.profiling = False
+        return requested
+
+    async def profile_threads(self, client: Client, fname: str) -> int:
+        """
+        在cProfile下执行一轮check_threads，结果写入状态文件
 
-        await asyncio.gather(*[check_comment_of_db(comment) for comment in comments])
+        同一时间只有一个贴吧采样，采样期间其他贴吧的协程也会被计入
+        """
+        self.profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return await self.check_threads(client, fname)
+        finally:
+            profiler.disable()
+            self.profiling = False
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(env.PROFILE_LINES)
+            status.put("profile", {"forum": fname, "time": int(time.time()), "stats": out.getvalue()})
+            logger.info(f"[Reviewer] profiled one cycle of {fname}")
+
+    def export_status(self):
+        """
+        把运行状态与指标写入状态文件
+        """
+        status.put("dispatcher", self.dispatcher.stats())
+        status.put("pipeline", {stage.name: stage.stats() for stage in self.stages})
+        status.put("seen", self.seen.stats())
+        status.put("compaction", self.compactor.stats())
+        status.put("media", media.stats())
+        status.put("verdicts", self.verdicts.stats())
+        status.put("metrics", metrics.collect())
+        status.put("checkers", manager.stats_json())
+        status.save()
+
+    async def export_loop(self):
+        """
+        审查进行中也定期导出，使并发数、队列深度等瞬时指标反映繁忙时的状态
+        """
+        while True:
+            await sleep(env.METRICS_INTERVAL)
+            self.export_status()
 
-    async def run_with_client(self, user: User, min_time=35.0, max_time=60.0):
+    async def run_with_client(self, fname: str, min_time=env.MIN_INTERVAL, max_time=env.MAX_INTERVAL):
         """
-        实现持续监控的关键函数
+        实现持续监控单个贴吧的关键函数，间隔时间随贴吧活跃度在min_time与max_time之间调整
         Args:
-            user: 传入了执行账号
+            fname: 贴吧名
             min_time: 最短间隔时间（单位：秒）
             max_time: 最大间隔时间（单位：秒）
         """
+        interval = PollInterval(min_time, max_time)
         while True:
-            async with Client(user.BDUSS, user.STOKEN) as client:
-                logger.debug(f"[Reviewer] review {self.FUP.fname}")
-                rst = await RForum.get(fname=self.FUP.fname)
-                if rst.enable:
-                    await self.check_threads(client, self.FUP.fname)
-                if self.no_exec:
-                    break
-            await sleep(random.uniform(min_time, max_time))
+            user = await self.get_account(fname)
+            if user:
+                client = await clients.get(user.BDUSS, user.STOKEN)
+                logger.debug(f"[Reviewer] review {fname}")
+                await caches.sync()
+                async with self.forum_semaphore:
+                    start = time.perf_counter()
+                    if await self.take_profile_request():
+                        new_objects = await self.profile_threads(client, fname)
+                    else:
+                        new_objects = await self.check_threads(client, fname)
+                    metrics.cycle.set(round(time.perf_counter() - start, 3), forum=fname)
+                interval.update(new_objects, self.last_times.get(fname, ()))
+                logger.debug(f"[Reviewer] {fname} next review in {interval.interval:.1f}s, {interval.reason}")
+                status.set("interval", fname, interval.to_json())
+                self.export_status()
+            else:
+                logger.warning(f"[Reviewer] no account for {fname}")
+            if self.no_exec:
+                break
+            await sleep(interval.sleep_time())
+
+    async def get_account(self, fname: str) -> Optional[User]:
+        """
+        获取用于审查该吧的账号，该吧没有可用的吧务账号时使用管理员账号
+        Args:
+            fname: 贴吧名
+        """
+        accounts = await forum_accounts.get()
+        if fname in accounts:
+            return accounts[fname]
+        if self.FUP:
+            return await self.FUP.user
+        return None
+
+    async def schedule(self):
+        """
+        为新启用的贴吧启动审查循环，停止已关闭的贴吧的审查循环
+        """
+        await self.sync_forums()
+        enabled = set(await RForum.filter(enable=True).values_list("fname", flat=True))
+
+        for fname, task in list(self.tasks.items()):
+            if task.done():
+                if not task.cancelled() and task.exception():
+                    logger.warning(f"[Reviewer] {fname} stopped: {task.exception()!r}")
+                self.tasks.pop(fname)
+            elif fname not in enabled:
+                task.cancel()
+                self.tasks.pop(fname)
+                status.remove("interval", fname)
+                status.save()
+                logger.info(f"[Reviewer] stop review {fname}")
+
+        for fname in enabled - self.tasks.keys():
+            self.tasks[fname] = asyncio.create_task(self.run_with_client(fname))
+            logger.info(f"[Reviewer] start review {fname}")
 
     @classmethod
     async def get_fup(cls):
@@ -249,6 +539,16 @@ class Reviewer(BasePlugin):
                 await RForum.create(fname=fup.fname)
         return fup
 
+    @classmethod
+    async def sync_forums(cls):
+        """
+        为所有有吧务账号的贴吧创建监控记录，新记录默认关闭
+        """
+        fnames = set(await ForumUserPermission.filter(
+            permission__in=Permission.min()).values_list("fname", flat=True))
+        fnames.difference_update(await RForum.all().values_list("fname", flat=True))
+        await RForum.bulk_create([RForum(fname=fname) for fname in fnames])
+
     @classmethod
     async def init_plugin(cls):
         logging.set_logger(logger)
@@ -258,6 +558,7 @@ class Reviewer(BasePlugin):
             await Config.set_config(key="REVIEW_NO_EXEC", v1=True)
 
         await cls.get_fup()
+        await cls.sync_forums()
 
         await RFunction.filter(function__not_in=manager.check_name_map).delete()
         old_name_map: List[str] = [i.function for i in (await RFunction.all())]
@@ -268,6 +569,16 @@ class Reviewer(BasePlugin):
                 func_list.append(RFunction(function=c))
         await RFunction.bulk_create(func_list)
 
+    @staticmethod
+    async def check_dependencies():
+        """
+        启用了图片检查但没有安装opencv或numpy时给出警告，否则check_image会对每张图片解码失败而放行
+        """
+        missing = [name for name in ("cv2", "numpy") if importlib.util.find_spec(name) is None]
+        if missing and await RFunction.filter(function="check_image", enable=True).exists():
+            logger.warning(f"[review] check_image is enabled but {', '.join(missing)} is not installed, "
+                           f"images will not be checked. Install with `pip install aiotieba[img]`")
+
     async def on_start(self):
         logging.set_logger(logger)
         await Tortoise.init(config=self.kwargs["db_config"])
@@ -275,12 +586,40 @@ class Reviewer(BasePlugin):
 
         self.no_exec = await Config.get_bool(key="REVIEW_NO_EXEC")
         self.FUP = await self.get_fup()
+        await caches.sync()
+        await self.check_dependencies()
+        await self.seen.load()
+        media.load()
+        await self.start_pipeline()
 
     async def on_running(self):
-        user: User = await self.FUP.user
-        await asyncio.gather(self.run_with_client(user))
+        exporter = asyncio.create_task(self.export_loop())
+        if self.no_exec:
+            fnames = await RForum.filter(enable=True).values_list("fname", flat=True)
+            try:
+                await asyncio.gather(*[self.run_with_client(fname) for fname in fnames])
+            finally:
+                exporter.cancel()
+            return
+
+        compaction = asyncio.create_task(self.compactor.run())
+        try:
+            while True:
+                await self.schedule()
+                await self.seen.maintain()
+                await sleep(env.SCHEDULE_INTERVAL)
+        finally:
+            exporter.cancel()
+            compaction.cancel()
+            for task in self.tasks.values():
+                task.cancel()
 
     async def on_stop(self):
+        await self.stop_pipeline()
+        manager.shutdown()
+        await media.close()
+        self.seen.save()
+        await clients.close()
         try:
             await connections.close_all()
         except ConfigurationError:
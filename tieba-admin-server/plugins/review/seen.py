@@ -0,0 +1,246 @@
+import hashlib
+import math
+import os
+import pickle
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sanic.log import logger
+from tortoise import timezone
+
+from core.env import CACHE_PATH
+from .models import Post as RPost
+
+SEEN_FILE = f"{CACHE_PATH}/review_seen.pickle"
+
+
+class BloomFilter(object):
+    """
+    布隆过滤器，判断为不存在的一定不存在，判断为存在的有error_rate的概率误判
+
+    Attributes:
+        capacity: 预计容纳的元素数，超过后误判率上升
+        error_rate: 达到容量时的误判率
+        size: 位数组长度
+        hashes: 哈希函数个数
+        count: 已加入的元素数
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: int):
+        digest = hashlib.blake2b(key.to_bytes(8, "little", signed=True), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: int):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key: int) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+    def dump(self) -> Dict:
+        return {"capacity": self.capacity, "error_rate": self.error_rate, "count": self.count, "bits": bytes(self.bits)}
+
+    @staticmethod
+    def restore(data: Dict) -> "BloomFilter":
+        """
+        从dump()的结果恢复，参数不一致时抛出ValueError
+        """
+        bloom = BloomFilter(data["capacity"], data["error_rate"])
+        if len(data["bits"]) != len(bloom.bits):
+            raise ValueError("bloom filter size mismatch")
+        bloom.bits = bytearray(data["bits"])
+        bloom.count = data["count"]
+        return bloom
+
+
+class SeenSet(object):
+    """
+    review_post表前的内存已见集合
+
+    最近见过的pid及其回复数保存在LRU中，更早的pid只记录在布隆过滤器里。
+    查询时LRU命中直接返回回复数，布隆过滤器判断不存在的一定是新内容，两者都无需访问数据库，
+    只有布隆过滤器判断可能存在的pid才查询数据库。
+    LRU与布隆过滤器定期写入快照，重启后先读取快照，再补上快照之后数据库中新增或修改的记录。
+    快照只包含基本类型；尚未成功加载时不写入快照，以免空的过滤器覆盖有效快照
+
+    Attributes:
+        recent_size: LRU容量
+        bloom: 布隆过滤器，元素数超过容量时从数据库重建为两倍容量
+        path: 快照路径
+        snapshot_interval: 快照间隔（单位：秒）
+    """
+    # 读取快照时向前多补的时间，覆盖写入数据库与写入快照之间的误差
+    CATCH_UP_MARGIN = 60
+    # 从数据库重建布隆过滤器时每批读取的行数
+    BATCH_SIZE = 10000
+
+    def __init__(self, recent_size: int, bloom_capacity: int, error_rate: float,
+                 path: str = SEEN_FILE, snapshot_interval: float = 300):
+        self.recent_size = recent_size
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(bloom_capacity, error_rate)
+        self.recent: OrderedDict[int, Optional[int]] = OrderedDict()
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self._last_snapshot = time.monotonic()
+        self._rebuilding: Optional[List[int]] = None
+        self.loaded = False
+
+        self.recent_hits = 0
+        self.new = 0
+        self.db_lookups = 0
+        self.false_positives = 0
+
+    def _remember(self, pid: int, reply_num: Optional[int]):
+        self.recent[pid] = reply_num
+        self.recent.move_to_end(pid)
+        if len(self.recent) > self.recent_size:
+            self.recent.popitem(last=False)
+
+    def add(self, items: Dict[int, Optional[int]]):
+        """
+        记录已写入数据库的pid及其回复数
+        Args:
+            items: pid -> reply_num，楼中楼的回复数为None
+        """
+        for pid, reply_num in items.items():
+            if pid not in self.recent:
+                if pid not in self.bloom:
+                    self.bloom.add(pid)
+                if self._rebuilding is not None:
+                    self._rebuilding.append(pid)
+            self._remember(pid, reply_num)
+
+    async def lookup(self, pids: Iterable[int]) -> Dict[int, Optional[int]]:
+        """
+        查询已见过的pid，可直接替代对review_post的pid__in查询
+        Args:
+            pids: 需要查询的pid
+
+        Returns:
+            已见过的pid -> reply_num，未见过的pid不在结果中
+        """
+        rst = {}
+        maybe = []
+        for pid in pids:
+            if pid in self.recent:
+                rst[pid] = self.recent[pid]
+                self.recent.move_to_end(pid)
+                self.recent_hits += 1
+            elif pid in self.bloom:
+                maybe.append(pid)
+            else:
+                self.new += 1
+        if maybe:
+            rows = await RPost.filter(pid__in=maybe).values_list("pid", "reply_num")
+            self.db_lookups += len(maybe)
+            self.false_positives += len(maybe) - len(rows)
+            for pid, reply_num in rows:
+                rst[pid] = reply_num
+                self._remember(pid, reply_num)
+        return rst
+
+    async def rebuild(self, capacity: int = None):
+        """
+        从数据库重建布隆过滤器，重建期间新加入的pid会补进新的过滤器
+        Args:
+            capacity: 新的容量，默认为当前容量
+        """
+        capacity = max(capacity or self.bloom.capacity, await RPost.all().count() * 2)
+        bloom = BloomFilter(capacity, self.error_rate)
+        self._rebuilding = []
+        try:
+            last = None
+            while True:
+                query = RPost.all().order_by("pid").limit(self.BATCH_SIZE)
+                if last is not None:
+                    query = query.filter(pid__gt=last)
+                pids = await query.values_list("pid", flat=True)
+                for pid in pids:
+                    bloom.add(pid)
+                if len(pids) < self.BATCH_SIZE:
+                    break
+                last = pids[-1]
+            for pid in self._rebuilding:
+                bloom.add(pid)
+            self.bloom = bloom
+        finally:
+            self._rebuilding = None
+        logger.info(f"[review] seen set rebuilt, {bloom.count} pids, capacity {bloom.capacity}")
+
+    async def load(self):
+        """
+        读取快照并补上快照之后的记录，没有可用快照时从数据库重建
+        """
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+            bloom = BloomFilter.restore(snapshot["bloom"])
+            recent = OrderedDict(snapshot["recent"])
+            saved_at = snapshot["saved_at"]
+        except Exception as e:
+            logger.info(f"[review] no usable seen snapshot ({e!r}), rebuild from database")
+            await self.rebuild()
+            self.loaded = True
+            return
+
+        self.bloom, self.recent = bloom, recent
+        since = timezone.now() - timedelta(seconds=time.time() - saved_at + self.CATCH_UP_MARGIN)
+        rows = await RPost.filter(date_updated__gte=since).values_list("pid", "reply_num")
+        self.add(dict(rows))
+        self.loaded = True
+        logger.info(f"[review] seen snapshot loaded, caught up {len(rows)} pids")
+
+    def save(self):
+        """
+        写入快照，先写临时文件再替换，尚未成功加载时不写入
+        """
+        if not self.loaded:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "bloom": self.bloom.dump(),
+                "recent": list(self.recent.items()),
+                "saved_at": time.time(),
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self._last_snapshot = time.monotonic()
+
+    async def maintain(self):
+        """
+        定期调用，布隆过滤器满了时扩容，到达间隔时写入快照
+        """
+        if self.bloom.full:
+            await self.rebuild(self.bloom.capacity * 2)
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.save()
+
+    def stats(self):
+        return {
+            "recent": len(self.recent),
+            "bloom_count": self.bloom.count,
+            "bloom_capacity": self.bloom.capacity,
+            "recent_hits": self.recent_hits,
+            "new": self.new,
+            "db_lookups": self.db_lookups,
+            "false_positives": self.false_positives,
+        }
@@ -0,0 +1,54 @@
+import json
+import os
+from typing import Any, Dict
+
+from core.env import CACHE_PATH
+
+STATUS_FILE = f"{CACHE_PATH}/review_status.json"
+
+
+class Status(object):
+    """
+    插件进程的运行状态
+
+    插件运行在独立进程中，状态由插件进程写入json文件，接口进程读取后返回
+
+    Attributes:
+        path: 状态文件路径
+        data: 插件进程中的状态
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.data: Dict[str, Dict[str, Any]] = {}
+
+    def set(self, section: str, key: str, value: Any):
+        self.data.setdefault(section, {})[key] = value
+
+    def put(self, section: str, value: Dict[str, Any]):
+        self.data[section] = value
+
+    def remove(self, section: str, key: str):
+        self.data.get(section, {}).pop(key, None)
+
+    def save(self):
+        """
+        写入状态文件，先写临时文件再替换，读取方不会读到写了一半的文件
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        读取状态文件，插件未运行过时返回空字典
+        """
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+status = Status(STATUS_FILE)
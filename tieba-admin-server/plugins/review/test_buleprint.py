@@ -0,0 +1,65 @@
+import unittest
+from types import SimpleNamespace
+
+from core.exception import ArgException
+from .buleprint import _rule_body, parse_keywords, parse_rule
+
+
+class ParseRuleTestCase(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(parse_rule({"pattern": "VX", "min_level": "2", "day": -1}), {
+            "pattern": "VX",
+            "types": "thread,post,comment",
+            "min_level": 2,
+            "max_level": 18,
+            "action": "delete",
+            "day": -1,
+            "enable": True,
+            "note": "",
+        })
+        self.assertEqual(parse_rule({"pattern": "VX", "action": "block"})["day"], 1)
+        self.assertEqual(parse_rule({"pattern": "VX", "action": "hide", "types": ["thread"]})["types"], "thread")
+
+    def test_invalid(self):
+        for rule in [
+            {},
+            {"pattern": 1},
+            {"pattern": "(a+)+"},
+            {"pattern": "VX", "types": "thread"},
+            {"pattern": "VX", "types": [{}]},
+            {"pattern": "VX", "min_level": "x"},
+            {"pattern": "VX", "max_level": None},
+            {"pattern": "VX", "min_level": 5, "max_level": 3},
+            {"pattern": "VX", "action": ["delete"]},
+            {"pattern": "VX", "action": "hide"},
+            {"pattern": "VX", "day": "x"},
+            {"pattern": "VX", "day": 5},
+            {"pattern": "VX", "action": "block", "day": True},
+        ]:
+            with self.assertRaises(ArgException, msg=rule):
+                parse_rule(rule)
+
+    def test_body(self):
+        self.assertEqual(_rule_body(SimpleNamespace(json=None)), {})
+        with self.assertRaises(ArgException):
+            _rule_body(SimpleNamespace(json=[{"id": 1}]))
+
+
+class ParseKeywordsTestCase(unittest.TestCase):
+    def test_valid(self):
+        self.assertEqual(parse_keywords(["加微信", "v x", "$100"]), ["加微信", "v x", "$100"])
+
+    def test_empty_after_normalize(self):
+        # 只含符号、货币符号、标点的关键词规范化后为空，不能静默丢弃
+        for keywords in [["加微信", "￥￥"], ["$"], ["。。。"], ["  "], ["★☆"]]:
+            with self.assertRaises(ArgException, msg=keywords):
+                parse_keywords(keywords)
+
+    def test_type(self):
+        for keywords in ["加微信", [1], {"k": 1}]:
+            with self.assertRaises(ArgException):
+                parse_keywords(keywords)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest.mock import patch
+
+from aiotieba.api._classdef.contents import FragText
+from aiotieba.api.get_posts._classdef import Contents_p, Post, UserInfo_p
+from aiotieba.api.get_threads._classdef import Contents_t, Thread, UserInfo_t
+
+from core.cache import VersionCache
+from . import env
+from .checker import CheckerManager
+from .cpu import CheckInput
+from .execute import ExecuteType, Verdict
+
+
+def _thread(text: str) -> Thread:
+    return Thread(contents=Contents_t(objs=[FragText(text)], texts=[FragText(text)]), fid=1, tid=2, pid=3,
+                  user=UserInfo_t(user_id=4, level=5), author_id=4)
+
+
+class CpuCheckerTestCase(unittest.TestCase):
+    def test_cpu_bound_checker(self):
+        manager = CheckerManager()
+
+        @manager.thread(cpu_bound=True)
+        def long_text(data: CheckInput):
+            if len(data.text) > 10:
+                return Verdict("delete")
+
+        check = manager.check_map['thread'][0]
+
+        async def run():
+            try:
+                hit = await manager.run(check, _thread("a" * 20), None, 'thread')
+                miss = await manager.run(check, _thread("a"), None, 'thread')
+            finally:
+                manager.shutdown()
+            return hit, miss
+
+        hit, miss = asyncio.run(run())
+        self.assertEqual(hit.option, ExecuteType.ThreadDelete)
+        self.assertEqual(hit.note, {"long_text"})
+        self.assertEqual(miss.option, ExecuteType.Empty)
+        self.assertEqual(manager.stats["long_text"]["hits"], 1)
+
+    def test_check_input(self):
+        data = CheckInput.from_obj('thread', _thread("text"))
+        self.assertEqual((data.tid, data.pid, data.user_id, data.level, data.text), (2, 3, 4, 5, "text"))
+        self.assertEqual(pickle.loads(pickle.dumps(data)), data)
+
+    def test_requires(self):
+        manager = CheckerManager()
+
+        async def load():
+            return 10
+
+        limit = VersionCache("limit", "VER_LIMIT", load)
+
+        @manager.thread(cpu_bound=True, requires=[limit])
+        def long_text(data: CheckInput, max_length: int):
+            if len(data.text) > max_length:
+                return Verdict("delete")
+
+        check = manager.check_map['thread'][0]
+
+        async def run():
+            try:
+                return await manager.run(check, _thread("a" * 20), None, 'thread')
+            finally:
+                manager.shutdown()
+
+        self.assertEqual(asyncio.run(run()).option, ExecuteType.ThreadDelete)
+        limit.value = 30
+        self.assertEqual(asyncio.run(run()).option, ExecuteType.Empty)
+
+    def test_timeout(self):
+        manager = CheckerManager()
+
+        @manager.thread(cpu_bound=True)
+        def slow(data: CheckInput):
+            time.sleep(0.5)
+
+        check = manager.check_map['thread'][0]
+
+        async def run():
+            try:
+                return await manager.run(check, _thread("text"), None, 'thread')
+            finally:
+                manager.shutdown()
+
+        with patch.object(env, "CPU_TIMEOUT", 0.05):
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(run())
+        self.assertEqual(manager.stats_json()["slow"]["timeouts"], 1)
+
+    def test_verdict_hide(self):
+        post = Post(contents=Contents_p(objs=[FragText("text")], texts=[FragText("text")]), fid=1, tid=2, pid=3,
+                    user=UserInfo_p(user_id=4, level=5), author_id=4)
+        self.assertEqual(Verdict("hide", 3).to_executor(None, _thread("text")).option, ExecuteType.ThreadHide)
+        self.assertEqual(Verdict("hide", 3).to_executor(None, post).option, ExecuteType.PostDelete)
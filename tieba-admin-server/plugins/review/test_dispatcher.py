@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from tortoise import Tortoise
+
+from core.models import ExecuteLog, ExecuteType
+from .dispatcher import Dispatcher
+
+DB_CONFIG = {
+    'connections': {
+        'default': "sqlite://:memory:"
+    },
+    'apps': {
+        'models': {
+            "models": ["core.models"],
+            'default_connection': 'default',
+        }
+    },
+    "use_tz": False,
+    "timezone": "Asia/Shanghai",
+}
+
+
+class FakeExecutor(object):
+    def __init__(self, pid: int, fail: bool = False):
+        self.pid = pid
+        self.fail = fail
+
+    async def execute(self):
+        if self.fail:
+            raise ValueError(self.pid)
+        return [ExecuteLog(user="test", type=ExecuteType.PostDelete.value, obj=str(self.pid))], []
+
+
+class DispatcherTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await Tortoise.init(config=DB_CONFIG)
+        await Tortoise.generate_schemas()
+
+    async def asyncTearDown(self):
+        await Tortoise.close_connections()
+
+    async def test_batched_logs(self):
+        dispatcher = Dispatcher(1, 4, flush_size=3, flush_interval=3600)
+        await dispatcher.start()
+        with patch.object(ExecuteLog, "bulk_create", wraps=ExecuteLog.bulk_create) as bulk_create:
+            for pid in range(7):
+                await dispatcher.put(FakeExecutor(pid, fail=pid == 6))
+            await dispatcher.stop()
+        # 积累到flush_size时批量写入，而不是每次操作写一次
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [3, 3])
+        self.assertEqual(sorted(await ExecuteLog.all().values_list("obj", flat=True)), [str(i) for i in range(6)])
+        stats = dispatcher.stats()
+        self.assertEqual((stats["executed"], stats["failed"], stats["logged"], stats["pending_logs"]), (7, 1, 6, 0))
+
+    async def test_stop_during_flush(self):
+        # stop取消worker时worker可能正在写入，这批记录不能丢失
+        dispatcher = Dispatcher(4, 8, flush_size=2, flush_interval=3600)
+        await dispatcher.start()
+        for pid in range(20):
+            await dispatcher.put(FakeExecutor(pid))
+        await dispatcher.stop()
+        self.assertEqual(await ExecuteLog.all().count(), 20)
+        self.assertEqual(dispatcher.logged, 20)
+
+    async def test_flush_failure_keeps_logs(self):
+        dispatcher = Dispatcher(1, 4, flush_size=100, flush_interval=3600)
+        dispatcher.logs = [ExecuteLog(user="test", type=ExecuteType.PostDelete.value, obj="1")]
+        with patch.object(ExecuteLog, "bulk_create", side_effect=RuntimeError("db")):
+            await dispatcher.flush()
+        self.assertEqual(len(dispatcher.logs), 1)
+        self.assertEqual(dispatcher.logged, 0)
+
+        await dispatcher.flush()
+        self.assertEqual(await ExecuteLog.all().count(), 1)
+        self.assertEqual(dispatcher.logs, [])
+
+    async def test_flush_interval(self):
+        dispatcher = Dispatcher(1, 4, flush_size=100, flush_interval=0.05)
+        await dispatcher.start()
+        try:
+            await dispatcher.put(FakeExecutor(1))
+            await asyncio.sleep(0.2)
+            self.assertEqual(await ExecuteLog.all().count(), 1)
+        finally:
+            await dispatcher.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import importlib.util
+import random
+import unittest
+
+from .imagehash import HashIndex, from_hex, to_hex
+
+
+class HashIndexTestCase(unittest.TestCase):
+    def test_same_as_linear_scan(self):
+        rand = random.Random(0)
+        hashes = [rand.getrandbits(64) for _ in range(2000)]
+        index = HashIndex(hashes, max_distance=6)
+        queries = [h ^ (1 << rand.randrange(64)) ^ (1 << rand.randrange(64)) for h in hashes[:200]]
+        queries += [rand.getrandbits(64) for _ in range(200)]
+        for q in queries:
+            distance = min((h ^ q).bit_count() for h in hashes)
+            match = index.search(q)
+            if distance <= 6:
+                self.assertEqual(match[1], distance)
+            else:
+                self.assertIsNone(match)
+
+    def test_hex(self):
+        self.assertEqual(from_hex(to_hex(255)), 255)
+        self.assertEqual(to_hex(255), "00000000000000ff")
+        with self.assertRaises(ValueError):
+            from_hex("ff")
+
+
+@unittest.skipUnless(importlib.util.find_spec("cv2"), "opencv is not installed")
+class PhashTestCase(unittest.TestCase):
+    def test_resized_image_is_similar(self):
+        import cv2 as cv
+        import numpy as np
+
+        from .imagehash import phash
+
+        rand = np.random.default_rng(0)
+        img = cv.GaussianBlur(rand.integers(0, 255, (240, 320, 3), dtype=np.uint8), (15, 15), 0)
+        other = cv.GaussianBlur(rand.integers(0, 255, (240, 320, 3), dtype=np.uint8), (15, 15), 0)
+        small = cv.resize(img, (160, 120))
+        self.assertLessEqual((phash(img) ^ phash(small)).bit_count(), 6)
+        self.assertGreater((phash(img) ^ phash(other)).bit_count(), 6)
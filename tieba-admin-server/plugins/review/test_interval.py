@@ -0,0 +1,29 @@
+import unittest
+
+from .interval import PollInterval
+
+
+class PollIntervalTestCase(unittest.TestCase):
+    def test_burst(self):
+        interval = PollInterval(10, 120)
+        interval.update(0, now=1000)
+        self.assertEqual(interval.update(200, now=1060), 10)
+        self.assertIn("floor", interval.reason)
+
+    def test_idle(self):
+        interval = PollInterval(10, 120)
+        interval.update(200, now=1000)
+        self.assertEqual(interval.interval, 10)
+        self.assertEqual(interval.update(0, [0, 10], now=1010), 15)
+        self.assertEqual(interval.update(0, now=1025), 22.5)
+        self.assertIn("idle", interval.reason)
+
+    def test_replies(self):
+        interval = PollInterval(10, 120)
+        now = 100000
+        self.assertEqual(interval.update(0, [now - i * 10 for i in range(60)], now=now), 50)
+        self.assertIn("replied", interval.reason)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import re
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from aiotieba.api._classdef.contents import FragText
+from aiotieba.api.get_threads._classdef import Contents_t, Thread, UserInfo_t
+
+from core.models import ExecuteType
+from . import env
+from .checker import check_rule, manager, rule_matcher
+from .matcher import KeywordMatcher, RuleMatcher, required_literal, validate_pattern
+
+
+class KeywordMatcherTestCase(unittest.TestCase):
+    def test_findall(self):
+        matcher = KeywordMatcher(["he", "she", "his", "hers"])
+        self.assertEqual(matcher.findall("ushers"), {"he", "she", "hers"})
+        self.assertEqual(matcher.findall("ahishers"), {"his", "he", "she", "hers"})
+        self.assertEqual(matcher.findall("nothing"), set())
+
+    def test_same_as_find(self):
+        keywords = ["加微信", "微信", "代刷", "刷单", "兼职日结", "日结"]
+        texts = ["兼职日结加微信", "代刷单", "正常发言", "", "微微信信"]
+        matcher = KeywordMatcher(keywords)
+        for text in texts:
+            self.assertEqual(matcher.findall(text), {k for k in keywords if text.find(k) != -1})
+            self.assertEqual(matcher.search(text), any(text.find(k) != -1 for k in keywords))
+
+    def test_automaton(self):
+        keywords = [f"{i}词" for i in range(KeywordMatcher.SMALL * 2)] + ["加微信", "微信"]
+        matcher = KeywordMatcher(keywords)
+        self.assertEqual(matcher.findall("12词加微信"), {"12词", "2词", "加微信", "微信"})
+        self.assertTrue(matcher.search("0词"))
+        self.assertFalse(matcher.search("没有命中"))
+
+    def test_empty(self):
+        matcher = KeywordMatcher(["", ])
+        self.assertFalse(matcher)
+        self.assertEqual(matcher.findall("abc"), set())
+        self.assertFalse(matcher.search("abc"))
+
+
+def _rule(id, pattern, types="thread,post,comment", min_level=1, max_level=18, action="delete", day=0):
+    return SimpleNamespace(id=id, pattern=pattern, types=types, min_level=min_level, max_level=max_level,
+                           action=action, day=day)
+
+
+class RuleMatcherTestCase(unittest.TestCase):
+    def test_scope(self):
+        matcher = RuleMatcher([
+            _rule(1, r"v\s*x\s*\d{5,}", max_level=3),
+            _rule(2, r"(代|带)刷", types="thread"),
+            _rule(3, r"兼职(日|周)结", min_level=4),
+        ])
+        self.assertEqual(matcher.search("post", 1, "加v x 123456").id, 1)
+        self.assertIsNone(matcher.search("post", 5, "加v x 123456"))
+        self.assertEqual(matcher.search("thread", 10, "带刷").id, 2)
+        self.assertIsNone(matcher.search("comment", 10, "带刷"))
+        self.assertEqual(matcher.search("comment", 10, "兼职周结").id, 3)
+        self.assertIsNone(matcher.search("comment", 1, "兼职周结"))
+
+    def test_same_as_loop(self):
+        rules = [_rule(i, p) for i, p in enumerate([
+            r"词\d+号", r"加(微|薇)信?", r"[a-z]+@qq", r"q+q?群\d{6}", r"(?i)vx", r"\d{11}", r"免费领", r"日结"])]
+        padding = [_rule(i, f"填充{i}") for i in range(100, 100 + RuleMatcher.SMALL)]
+        matchers = [RuleMatcher(rules), RuleMatcher(rules + padding)]
+        for text in ["词42号", "加薇", "abc@qq.com", "qqq群123456", "VX", "13800000000", "免费领取日结", "正常", ""]:
+            expected = next((r for r in rules if re.search(r.pattern, text)), None)
+            for matcher in matchers:
+                self.assertIs(matcher.search("post", 5, text), expected, text)
+        self.assertFalse(RuleMatcher())
+
+    def test_validate_pattern(self):
+        for pattern in [r"[a-z]+@qq", r"加\s+微", r"(代|带)刷", r"(?:https?://)+", r"v\s*x\s*\d{5,}", r"(ab)+"]:
+            validate_pattern(pattern)
+        for pattern in [r"(a+)+$", r"(\w+\s?)*x", r"(a|ab)*c", r"(?:(?:ab)+)+", "", r"(?P<a>x)", r"("]:
+            with self.assertRaises(ValueError):
+                validate_pattern(pattern)
+
+    def test_required_literal(self):
+        self.assertEqual(required_literal(r"加(微|薇)信?"), "加")
+        self.assertEqual(required_literal(r"q+q?群\d{6}"), "q")
+        self.assertEqual(required_literal(r"(兼职日结)+"), "兼职日结")
+        self.assertEqual(required_literal(r"(?i)vx"), "")
+        self.assertEqual(required_literal(r"\d{11}"), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+def _thread(text: str, level: int = 1) -> Thread:
+    return Thread(contents=Contents_t(objs=[FragText(text)], texts=[FragText(text)]), fid=1, tid=2, pid=3,
+                  user=UserInfo_t(user_id=4, level=level), author_id=4)
+
+
+class CheckRuleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.value, self.loaded = rule_matcher.value, rule_matcher.loaded
+
+    def tearDown(self):
+        rule_matcher.value, rule_matcher.loaded = self.value, self.loaded
+        manager.shutdown()
+
+    def check(self, rules, text):
+        rule_matcher.value, rule_matcher.loaded = RuleMatcher(rules), True
+        check = next(c for c in manager.check_map['thread'] if c['function'] is check_rule)
+        return asyncio.run(manager.run(check, _thread(text), None, 'thread')).option
+
+    def test_raw_text(self):
+        # 规则作用于原文，大小写、空白与标点都保留
+        self.assertEqual(self.check([_rule(1, r"[a-z]+@qq")], "联系abc@qq.com"), ExecuteType.ThreadDelete)
+        self.assertEqual(self.check([_rule(1, r"VX")], "加VX"), ExecuteType.ThreadDelete)
+        self.assertEqual(self.check([_rule(1, r"VX")], "加vx"), ExecuteType.Empty)
+        self.assertEqual(self.check([_rule(1, r"加\s+微")], "加 微"), ExecuteType.ThreadDelete)
+        self.assertEqual(self.check([_rule(1, r"\bqq\b")], "my qq 123"), ExecuteType.ThreadDelete)
+        self.assertEqual(self.check([_rule(1, r"https?://")], "见https://example.com"), ExecuteType.ThreadDelete)
+
+    def test_action(self):
+        self.assertEqual(self.check([_rule(1, r"VX", action="hide", day=3)], "VX"), ExecuteType.ThreadHide)
+        self.assertEqual(self.check([_rule(1, r"VX", max_level=0)], "VX"), ExecuteType.Empty)
+
+    def test_process_pool(self):
+        # 进程池中的规则在启动进程时传入，规则变化后重建进程池
+        with patch.object(env, "CPU_POOL", "process"):
+            self.assertEqual(self.check([_rule(1, r"VX")], "VX"), ExecuteType.ThreadDelete)
+            self.assertEqual(self.check([_rule(1, r"QQ")], "VX"), ExecuteType.Empty)
+            self.assertEqual(self.check([_rule(1, r"QQ")], "QQ"), ExecuteType.ThreadDelete)
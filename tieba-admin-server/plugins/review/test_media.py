@@ -0,0 +1,118 @@
+import asyncio
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from .media import MediaCache, MediaTooLarge, UnsupportedMedia, decode, image_size
+
+try:
+    import cv2 as cv
+    import numpy as np
+except ImportError:
+    cv = None
+
+
+class FakeMediaCache(MediaCache):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.downloads = 0
+
+    async def _download(self, url: str) -> bytes:
+        self.downloads += 1
+        await asyncio.sleep(0.01)
+        return url.encode() * 10
+
+
+class ImageSizeTestCase(unittest.TestCase):
+    def test_png(self):
+        data = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 640, 480)
+        self.assertEqual(image_size(data), (640, 480))
+
+    def test_jpeg(self):
+        app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+        sof0 = b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 1080, 1920) + b"\x00" * 10
+        self.assertEqual(image_size(b"\xff\xd8" + app0 + sof0), (1920, 1080))
+
+    def test_webp(self):
+        riff = b"RIFF" + struct.pack("<I", 100) + b"WEBP"
+        vp8 = riff + b"VP8 " + struct.pack("<I", 80) + b"\x00" * 3 + b"\x9d\x01\x2a" + struct.pack("<HH", 640, 480)
+        self.assertEqual(image_size(vp8), (640, 480))
+        bits = (640 - 1) | (480 - 1) << 14
+        vp8l = riff + b"VP8L" + struct.pack("<I", 80) + b"\x2f" + struct.pack("<I", bits) + b"\x00" * 5
+        self.assertEqual(image_size(vp8l), (640, 480))
+        vp8x = riff + b"VP8X" + struct.pack("<I", 10) + b"\x00" * 4 + (640 - 1).to_bytes(3, "little") \
+            + (480 - 1).to_bytes(3, "little")
+        self.assertEqual(image_size(vp8x), (640, 480))
+
+    def test_unknown(self):
+        self.assertIsNone(image_size(b"RIFF0000WEBP"))
+        self.assertIsNone(image_size(b"\x00\x00\x01\x00" + b"\x00" * 30))
+
+
+@unittest.skipIf(cv is None, "requires opencv and numpy")
+class DecodeTestCase(unittest.TestCase):
+    def test_webp(self):
+        image = np.zeros((48, 64, 3), np.uint8)
+        for quality in (80, 101):
+            _, data = cv.imencode(".webp", image, [cv.IMWRITE_WEBP_QUALITY, quality])
+            self.assertEqual(decode(data.tobytes()).shape, (48, 64, 3))
+            with self.assertRaises(MediaTooLarge):
+                decode(data.tobytes(), max_pixels=100)
+
+    def test_unsupported(self):
+        with self.assertRaises(UnsupportedMedia):
+            decode(b"\x00\x00\x01\x00" + b"\x00" * 30)
+
+
+class MediaCacheTestCase(unittest.TestCase):
+    def test_coalesce_and_hit(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = FakeMediaCache(path, max_size=1000)
+
+            async def run():
+                rst = await asyncio.gather(*[cache.get("http://a/1.jpg", "abcdef0123") for _ in range(5)])
+                rst.append(await cache.get("http://b/1.jpg", "abcdef0123"))
+                return rst
+
+            rst = asyncio.run(run())
+            self.assertEqual(set(rst), {b"http://a/1.jpg" * 10})
+            self.assertEqual(cache.downloads, 1)
+            self.assertEqual(cache.coalesced, 4)
+            self.assertEqual(cache.hits, 1)
+
+            reloaded = MediaCache(path, max_size=1000)
+            reloaded.load()
+            self.assertEqual(reloaded.stats()["files"], 1)
+
+    def test_io_in_thread(self):
+        # 磁盘读写不能阻塞事件循环
+        with tempfile.TemporaryDirectory() as path:
+            cache = FakeMediaCache(path, max_size=300)
+
+            async def run():
+                with patch("asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+                    for i in range(3):
+                        await cache.get(f"http://a/{i}.jpg")
+                    self.assertEqual(await cache.get("http://a/2.jpg"), b"http://a/2.jpg" * 10)
+                return [call.args[0].__name__ for call in to_thread.call_args_list]
+
+            self.assertEqual(asyncio.run(run()), ["_write_file"] * 3 + ["_remove", "_read_file"])
+            self.assertEqual((cache.hits, cache.evicted), (1, 1))
+
+    def test_evict(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = FakeMediaCache(path, max_size=450)
+
+            async def run():
+                for i in range(3):
+                    await cache.get(f"http://a/{i}.jpg")
+                await cache.get("http://a/0.jpg")
+                await cache.get("http://a/3.jpg")
+
+            asyncio.run(run())
+            self.assertLessEqual(cache.size, 450)
+            self.assertEqual(cache.evicted, 1)
+            self.assertNotIn(cache.key("http://a/1.jpg"), cache._index)
+            self.assertIn(cache.key("http://a/0.jpg"), cache._index)
+            self.assertIn(cache.key("http://a/3.jpg"), cache._index)
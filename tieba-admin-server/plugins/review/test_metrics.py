@@ -0,0 +1,39 @@
+import unittest
+
+from .metrics import Counter, Gauge, Histogram, Metric, render
+
+
+class MetricsTestCase(unittest.TestCase):
+    def test_histogram(self):
+        histogram = Histogram("latency", "test", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, stage="fetch")
+        samples = {(name, dict(labels).get("le")): value for name, labels, value in histogram.samples()}
+        self.assertEqual(samples[("latency_bucket", "0.1")], 1)
+        self.assertEqual(samples[("latency_bucket", "1.0")], 3)
+        self.assertEqual(samples[("latency_bucket", "+Inf")], 4)
+        self.assertEqual(samples[("latency_count", None)], 4)
+
+    def test_render(self):
+        counter = Counter("fetched_total", "test")
+        counter.inc(2, type="post")
+        counter.inc(type="post")
+        self.assertEqual(render([counter.collect()]),
+                         '# HELP fetched_total test\n# TYPE fetched_total counter\nfetched_total{type="post"} 3\n')
+
+    def test_gauge_track(self):
+        depth = [0]
+        gauge = Gauge("queue_depth", "test")
+        gauge.set(1, stage="post")
+        gauge.track(lambda: depth[0], stage="check")
+        depth[0] = 7
+        self.assertEqual({dict(labels)["stage"]: value for _, labels, value in gauge.samples()},
+                         {"post": 1, "check": 7})
+
+    def test_abstract(self):
+        with self.assertRaises(TypeError):
+            Metric("metric", "test")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+
+from aiotieba.api._classdef.contents import FragText
+from aiotieba.api.get_threads._classdef import Contents_t, Thread
+
+from .matcher import KeywordMatcher
+from .normalize import normalize, normalized_text
+
+
+class NormalizeTestCase(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("加ＶＸ"), "加vx")
+        self.assertEqual(normalize("加​微‍信"), "加微信")
+        self.assertEqual(normalize("加.微-信！ 🌸"), "加微信")
+        self.assertEqual(normalize("Ⓠ群１２３"), "q群123")
+        self.assertEqual(normalize("vх"), "vx")
+        self.assertEqual(normalize(""), "")
+
+    def test_keyword_bypass(self):
+        matcher = KeywordMatcher([normalize("加微信"), normalize("VX")])
+        for text in ["加 微 信", "加‌微信", "＋V·Ｘ", "加.微.信"]:
+            self.assertTrue(matcher.search(normalize(text)), text)
+
+    def test_cached_on_object(self):
+        thread = Thread(contents=Contents_t(objs=[FragText("ＡＢＣ")], texts=[FragText("ＡＢＣ")]))
+        self.assertEqual(normalized_text(thread), "abc")
+        thread.contents.texts[0].text = "changed"
+        self.assertEqual(normalized_text(thread), "abc")
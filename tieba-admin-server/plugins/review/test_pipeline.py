@@ -0,0 +1,138 @@
+import asyncio
+import unittest
+
+from tortoise import Tortoise
+
+from .models import Post as RPost
+from .models import Thread as RThread
+from .pipeline import Cycle, Stage
+from .reviewer import Reviewer
+
+DB_CONFIG = {
+    'connections': {
+        'default': "sqlite://:memory:"
+    },
+    'apps': {
+        'models': {
+            # 以pytest或unittest运行时本包的模块名不同
+            "models": ["core.models", RThread.__module__],
+            'default_connection': 'default',
+        }
+    },
+    "use_tz": False,
+    "timezone": "Asia/Shanghai",
+}
+
+
+class StageTestCase(unittest.IsolatedAsyncioTestCase):
+    async def test_fan_out_and_failure(self):
+        handled = []
+
+        async def check(cycle: Cycle, item):
+            if item == 3:
+                raise ValueError(item)
+            handled.append(item)
+
+        async def split(cycle: Cycle, item):
+            for i in range(item):
+                await check_stage.put(cycle, i)
+
+        check_stage = Stage("check", 2, 2, check)
+        post_stage = Stage("post", 2, 2, split)
+        await check_stage.start()
+        await post_stage.start()
+        try:
+            cycle = Cycle(None, "test")
+            await post_stage.put(cycle, 5)
+            await asyncio.wait_for(cycle.wait(), 1)
+        finally:
+            await check_stage.stop()
+            await post_stage.stop()
+
+        self.assertEqual(sorted(handled), [0, 1, 2, 4])
+        self.assertEqual(cycle.failures, [("check", 3)])
+        self.assertEqual(cycle.pending, 0)
+        self.assertEqual((check_stage.processed, check_stage.failed), (5, 1))
+
+    async def test_cancelled_cycle_is_dropped(self):
+        started, release = asyncio.Event(), asyncio.Event()
+        handled = []
+
+        async def check(cycle: Cycle, item):
+            started.set()
+            await release.wait()
+            handled.append(item)
+
+        stage = Stage("check", 1, 10, check)
+        await stage.start()
+        try:
+            cycle = Cycle(None, "test")
+            for i in range(3):
+                await stage.put(cycle, i)
+            await started.wait()
+            cycle.cancel()
+            release.set()
+            await asyncio.wait_for(cycle.wait(), 1)
+        finally:
+            await stage.stop()
+
+        # 取消时正在处理的任务照常完成，队列中剩余的任务被丢弃
+        self.assertEqual(handled, [0])
+        self.assertEqual(stage.processed, 3)
+
+
+class PersistTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await Tortoise.init(config=DB_CONFIG)
+        await Tortoise.generate_schemas()
+        await RThread.create(tid=2, fid=1, last_time=100)
+        await RPost.create(pid=20, tid=2, reply_num=1)
+        self.reviewer = Reviewer()
+
+    async def asyncTearDown(self):
+        await Tortoise.close_connections()
+
+    def cycle(self) -> Cycle:
+        cycle = Cycle(None, "test")
+        cycle.checked = [("thread", 1, 1, 100), ("post", 1, 10, 3), ("comment", 1, 11, 10), ("post", 2, 21, 2)]
+        cycle.updated = [("thread", 2, 1, 200), ("post", 2, 20, 5)]
+        return cycle
+
+    async def test_persist(self):
+        await self.reviewer.persist(self.cycle())
+        self.assertEqual((await RThread.get(tid=1)).last_time, 100)
+        self.assertEqual((await RThread.get(tid=2)).last_time, 200)
+        self.assertEqual(dict(await RPost.all().values_list("pid", "reply_num")), {10: 3, 11: None, 20: 5, 21: 2})
+        self.assertEqual((await RPost.get(pid=11)).ppid, 10)
+
+    async def test_persist_failures(self):
+        cycle = self.cycle()
+        cycle.fail("comment", RPost(pid=22, tid=2))
+        await self.reviewer.persist(cycle)
+        # 出错的主题贴不更新，新记录的回复数记为0，下一轮会重新获取
+        self.assertEqual((await RThread.get(tid=1)).last_time, 100)
+        self.assertEqual((await RThread.get(tid=2)).last_time, 100)
+        self.assertEqual(dict(await RPost.all().values_list("pid", "reply_num")), {10: 3, 11: None, 20: 1, 21: 0})
+
+    async def test_cancel(self):
+        running = asyncio.Event()
+
+        async def run_cycle(cycle: Cycle):
+            cycle.checked, cycle.updated = self.cycle().checked, self.cycle().updated
+            running.set()
+            await asyncio.Event().wait()
+
+        self.reviewer.run_cycle = run_cycle
+        task = asyncio.create_task(self.reviewer.check_threads(None, "test"))
+        await running.wait()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        # 已检查的对象被记录，所有主题贴都按出错处理
+        self.assertEqual(dict(await RThread.all().values_list("tid", "last_time")), {1: 0, 2: 100})
+        self.assertEqual(dict(await RPost.all().values_list("pid", "reply_num")), {10: 0, 11: None, 20: 1, 21: 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import os
+import pickle
+import tempfile
+import unittest
+
+from .seen import BloomFilter, SeenSet
+
+
+class BloomFilterTestCase(unittest.TestCase):
+    def test_no_false_negative(self):
+        bloom = BloomFilter(10000, 0.01)
+        for pid in range(0, 20000, 2):
+            bloom.add(pid)
+        self.assertTrue(all(pid in bloom for pid in range(0, 20000, 2)))
+        false_positives = sum(1 for pid in range(1, 20000, 2) if pid in bloom)
+        self.assertLess(false_positives, 300)
+        self.assertFalse(bloom.full)
+
+
+class SeenSetTestCase(unittest.TestCase):
+    def test_lookup_without_db(self):
+        seen = SeenSet(2, 1000, 0.01)
+        seen.add({1: 3, 2: None})
+        rst = asyncio.run(seen.lookup([1, 2, 1000]))
+        self.assertEqual(rst, {1: 3, 2: None})
+        self.assertEqual(seen.recent_hits, 2)
+        self.assertEqual(seen.new, 1)
+        self.assertEqual(seen.db_lookups, 0)
+
+    def test_recent_eviction(self):
+        seen = SeenSet(2, 1000, 0.01)
+        seen.add({1: 0, 2: 0, 3: 0})
+        self.assertEqual(list(seen.recent), [2, 3])
+        self.assertIn(1, seen.bloom)
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as path:
+            file = os.path.join(path, "seen.pickle")
+            seen = SeenSet(2, 1000, 0.01, path=file)
+            seen.add({1: 0})
+            seen.save()
+            self.assertFalse(os.path.exists(file))
+
+            seen.loaded = True
+            seen.save()
+            with open(file, "rb") as f:
+                snapshot = pickle.load(f)
+            self.assertEqual(type(snapshot["bloom"]), dict)
+            bloom = BloomFilter.restore(snapshot["bloom"])
+            self.assertIn(1, bloom)
+            self.assertEqual(bloom.count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from aiotieba.api._classdef.contents import FragText
+from aiotieba.api.get_threads._classdef import Contents_t, Thread, UserInfo_t
+
+from core.models import ExecuteType
+from .checker import manager
+from .execute import Executor
+from .verdicts import VerdictCache
+
+
+class FakeVersionCache(object):
+    def __init__(self, value):
+        self.value = value
+
+    async def get(self):
+        return self.value
+
+
+def _thread(text: str, level: int = 1, user_id: int = 1) -> Thread:
+    return Thread(contents=Contents_t(objs=[FragText(text)], texts=[FragText(text)]), fid=1, tid=user_id,
+                  user=UserInfo_t(user_id=user_id, level=level))
+
+
+class VerdictCacheTestCase(unittest.TestCase):
+    def test_key(self):
+        key = VerdictCache.key
+        self.assertEqual(key("thread", _thread("加微信", user_id=1)), key("thread", _thread("加微信", user_id=2)))
+        # 正则规则作用于原文，原文不同的内容不能共用结论
+        self.assertNotEqual(key("thread", _thread("加微信")), key("thread", _thread("加 微.信")))
+        self.assertNotEqual(key("thread", _thread("加微信")), key("post", _thread("加微信")))
+        self.assertNotEqual(key("thread", _thread("加微信")), key("thread", _thread("加微信", level=2)))
+
+    def test_inconclusive_not_cacheable(self):
+        # check_image在图片下载或解码失败时放行，不能把放行结论给相同内容复用
+        for checks in manager.check_map.values():
+            for check in checks:
+                if check['function'].__name__ == "check_image":
+                    self.assertFalse(check['cacheable'])
+
+    def test_reuse_and_invalidate(self):
+        keywords = FakeVersionCache(object())
+        cache = VerdictCache(2, [keywords])
+        first, second = _thread("spam", user_id=1), _thread("spam", user_id=2)
+
+        async def run():
+            await cache.validate()
+            key = cache.key("thread", first)
+            self.assertIsNone(cache.get(key, None, first))
+            cache.put(key, Executor(None, first, option=ExecuteType.ThreadDelete, note={"check_keyword"}))
+
+            hit = cache.get(key, None, second)
+            self.assertIs(hit.obj, second)
+            self.assertEqual(hit.option, ExecuteType.ThreadDelete)
+            self.assertEqual(hit.note, {"check_keyword"})
+
+            keywords.value = object()
+            await cache.validate()
+            self.assertIsNone(cache.get(key, None, second))
+
+        asyncio.run(run())
+        self.assertEqual((cache.hits, cache.misses, cache.invalidations), (1, 2, 1))
+
+    def test_lru(self):
+        cache = VerdictCache(2, [])
+        for key in (b"a", b"b", b"c"):
+            cache.put(key, Executor())
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertIsNone(cache.get(b"a", None, None))
@@ -0,0 +1,83 @@
+import dataclasses
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+from aiotieba import Client
+from aiotieba.typing import Thread, Post, Comment
+
+from core.cache import VersionCache
+from .execute import Executor
+
+
+class VerdictCache(object):
+    """
+    按内容缓存checker结论的LRU
+
+    刷屏内容往往由很多账号重复发送，相同内容只需检查一次。键为对象类型、发送者等级及文本原文（正则规则作用于原文）的摘要，
+    值为只由这些信息决定的checker（注册时cacheable=True）合并后的操作。
+    watched中任一缓存重新加载（关键词、规则、启用的checker等发生变化）时清空
+
+    Attributes:
+        size: 容量
+        watched: 结论依赖的缓存
+        hits: 命中次数
+        misses: 未命中次数
+        invalidations: 因依赖变化清空的次数
+    """
+
+    def __init__(self, size: int, watched: List[VersionCache]):
+        self.size = size
+        self.watched = watched
+        self._data: OrderedDict[bytes, Executor] = OrderedDict()
+        self._values: tuple = ()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(_type: str, obj: Union[Thread, Post, Comment]) -> bytes:
+        content = f"{_type}\0{obj.user.level}\0{obj.text}"
+        return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+    async def validate(self):
+        """
+        依赖的缓存数据发生变化时清空
+        """
+        values = tuple([await cache.get() for cache in self.watched])
+        if len(values) != len(self._values) or any(a is not b for a, b in zip(values, self._values)):
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._values = values
+
+    def get(self, key: bytes, client: Client, obj: Union[Thread, Post, Comment]) -> Optional[Executor]:
+        """
+        Returns:
+            作用于obj的缓存操作，未命中时为None
+        """
+        decision = self._data.get(key)
+        if decision is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(key)
+        return dataclasses.replace(decision, client=client, obj=obj, note=set(decision.note))
+
+    def put(self, key: bytes, executor: Executor):
+        self._data[key] = dataclasses.replace(executor, client=None, obj=None, note=frozenset(executor.note))
+        self._data.move_to_end(key)
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "invalidations": self.invalidations,
+        }
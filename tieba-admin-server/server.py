@@ -2,6 +2,7 @@ import logging
 import os
 import signal
 from asyncio import sleep
+from multiprocessing import Value
 
 import aiotieba
 from argon2 import PasswordHasher
@@ -15,11 +16,13 @@ from tortoise.contrib.sanic import register_tortoise
 
 from core import env
 from core.account import bp_account
+from core.client import clients
 from core.exception import ArgException, FirstLoginError
-from core.jwt import authenticate, retrieve_user, JwtConfig, JwtResponse, scope_extender
+from core.jwt import authenticate, retrieve_user, extend_payload, scope_extender, \
+    JwtAuthentication, JwtConfig, JwtResponse
 from core.log import LOGGING_CONFIG, bp_log
 from core.manager import bp_manager
-from core.models import Permission, Config
+from core.models import Permission, Config, config_cache
 from core.utils import get_modules, json, sqlite_database_exits
 
 app = Sanic("tieba-admin-server", log_config=LOGGING_CONFIG)
@@ -61,13 +64,22 @@ app.blueprint(bp_account)
 
 Initialize(app, authenticate=authenticate,
            retrieve_user=retrieve_user,
+           extend_payload=extend_payload,
+           authentication_class=JwtAuthentication,
            configuration_class=JwtConfig,
            responses_class=JwtResponse,
            add_scopes_to_payload=scope_extender)
 
 
+@app.main_process_start
+async def init_shared_ctx(_app: Sanic):
+    _app.shared_ctx.config_version = Value("i", 0)
+
+
 @app.before_server_start
 async def init_server(_app: Sanic):
+    config_cache.share(_app.shared_ctx.config_version)
+    await Config.migrate()
     if (await Config.get_bool(key="first")) is None:
         await Config.set_config(key="first", v1=True)
 
@@ -76,6 +88,11 @@ async def init_server(_app: Sanic):
     _app.shared_ctx.password_hasher = PasswordHasher()
 
 
+@app.after_server_stop
+async def close_server(_app: Sanic):
+    await clients.close()
+
+
 @app.on_request
 async def first_login_check(rqt: Request):
     is_first = await Config.get_bool(key="first")